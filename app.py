@@ -1,11 +1,10 @@
 import streamlit as st
-import pandas as pd
 import random
 import time
 from tutorials import tutorials_data, display_tutorial
 from challenges import challenges_data, display_challenge
-from progress_tracker import load_progress, save_progress, display_progress
-from user_management import create_user, login_user
+from progress_tracker import load_progress, record_completion, display_progress, display_leaderboards
+from user_management import create_user, login_user, logout_user
 from code_executor import execute_python_code
 from database_manager import db_manager, migrate_from_json_if_needed
 from certificate_generator import display_certificate_page, verify_certificate_page
@@ -41,10 +40,6 @@ if 'completed_challenges' not in st.session_state:
 if 'emoji_collection' not in st.session_state:
     st.session_state.emoji_collection = []
 
-# Store tutorials and challenges data in session state for certificate requirements
-st.session_state.all_tutorials = tutorials_data
-st.session_state.all_challenges = challenges_data
-
 # Emoji rewards
 emojis = ["🐢", "🦊", "🐱", "🐶", "🦁", "🐯", "🦄", "🦋", "🐬", "🐙", "🦖", "🦕", "🐘", "🦒", "🐼"]
 
@@ -68,11 +63,7 @@ def next_tutorial():
             
             # Save progress
             if st.session_state.username:
-                save_progress(st.session_state.username, 
-                             st.session_state.points,
-                             st.session_state.completed_tutorials,
-                             st.session_state.completed_challenges,
-                             st.session_state.emoji_collection)
+                record_completion("tutorial", st.session_state.tutorial_index - 1, 5, reward_emoji)
     st.rerun()
 
 def prev_tutorial():
@@ -102,11 +93,7 @@ def complete_challenge():
         
         # Save progress
         if st.session_state.username:
-            save_progress(st.session_state.username, 
-                         st.session_state.points,
-                         st.session_state.completed_tutorials,
-                         st.session_state.completed_challenges,
-                         st.session_state.emoji_collection)
+            record_completion("challenge", st.session_state.challenge_index, 10, reward_emoji)
         
         # Display celebration
         st.balloons()
@@ -124,7 +111,7 @@ if st.session_state.username:
         st.sidebar.write(" ".join(st.session_state.emoji_collection))
     
     if st.sidebar.button("Log Out"):
-        st.session_state.username = None
+        logout_user()
         st.rerun()
 else:
     login_tab, signup_tab = st.sidebar.tabs(["Log In", "Sign Up"])
@@ -203,6 +190,8 @@ elif st.session_state.current_page == "progress":
                         st.session_state.completed_challenges,
                         len(tutorials_data),
                         len(challenges_data))
+        if st.session_state.user_id:
+            display_leaderboards(st.session_state.user_id, st.session_state.get("profile") or {})
     else:
         st.warning("Please log in to see your progress! 👆")
         st.button("Go Back to Home", on_click=go_to_page, args=("welcome",))
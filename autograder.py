@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+def read_submissions(path):
+    """
+    Read submissions from a JSONL file
+
+    Each line is an object with "user", "challenge" (index into
+    challenges_data, or the challenge's id in its content pack) and
+    "code". Blank lines are skipped.
+
+    Yields:
+        tuple: (line_number, submission dict, or None if the line is not valid JSON)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError:
+                yield line_number, None
+
+
+def _grade_one(item, challenges, execute, memoize):
+    """Grade one submission and return its result record"""
+    from code_executor import error_class
+    from grading import grade_submission
+
+    line_number, submission = item
+    record = {"line": line_number}
+    if not isinstance(submission, dict) or not isinstance(submission.get("code"), str):
+        record.update(passed=False, ran=False, error="Invalid submission line", seconds=0.0)
+        return record
+
+    record["user"] = submission.get("user")
+    index = submission.get("challenge")
+    if isinstance(index, str) and challenges.index_of(index) is not None:
+        index = challenges.index_of(index)
+    record["challenge"] = index
+    if not isinstance(index, int) or not 0 <= index < len(challenges):
+        record.update(passed=False, ran=False, error=f"Unknown challenge: {index!r}", seconds=0.0)
+        return record
+
+    started = time.perf_counter()
+    result = grade_submission(submission["code"], challenges[index]["grading"], execute=execute, memoize=memoize)
+    record.update(
+        passed=result["passed"],
+        ran=result["ran"],
+        feedback=result["feedback"],
+        error=result["error"],
+        error_class=error_class(result["error"]),
+        seconds=round(time.perf_counter() - started, 6)
+    )
+    return record
+
+
+def _percentile(sorted_values, fraction):
+    """Value below which the given fraction of sorted_values fall"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(records, wall_seconds):
+    """
+    Pass counts and timing statistics of a grading run
+
+    Args:
+        records (list): Result records from grade_file()
+        wall_seconds (float): Real time the whole run took
+
+    Returns:
+        dict: Totals, latency percentiles (in milliseconds of the graded
+            submissions that ran), throughput and per-challenge pass counts
+    """
+    latencies = sorted(record["seconds"] * 1000 for record in records if record.get("ran"))
+    per_challenge = defaultdict(lambda: {"submissions": 0, "passed": 0})
+    for record in records:
+        if isinstance(record.get("challenge"), int):
+            per_challenge[record["challenge"]]["submissions"] += 1
+            per_challenge[record["challenge"]]["passed"] += int(record["passed"])
+
+    return {
+        "submissions": len(records),
+        "passed": sum(1 for record in records if record["passed"]),
+        "rejected_before_running": sum(1 for record in records if not record["ran"] and not record["error"]),
+        "errors": sum(1 for record in records if record["error"]),
+        "wall_seconds": round(wall_seconds, 3),
+        "submissions_per_second": round(len(records) / wall_seconds, 1) if wall_seconds else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50), 2),
+            "p90": round(_percentile(latencies, 0.90), 2),
+            "p99": round(_percentile(latencies, 0.99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0
+        },
+        "per_challenge": {str(index): counts for index, counts in sorted(per_challenge.items())}
+    }
+
+
+def grade_file(input_path, output_path, workers=None, memoize=True):
+    """
+    Grade every submission in a JSONL file
+
+    Submissions run in a dedicated execution pool with one worker process
+    per core (or `workers`), with the same limits as the web app.
+
+    Args:
+        input_path (str): JSONL file of submissions
+        output_path (str): JSONL file for the results (one line per submission, same order)
+        workers (int, optional): Worker processes (and submissions graded at once)
+        memoize (bool): Reuse results of identical deterministic code;
+            turn off to measure the executor under load
+
+    Returns:
+        dict: Summary from summarize()
+    """
+    from challenges import challenges_data
+    from code_executor import execute_python_code
+    from execution_pool import ExecutionPool
+
+    workers = workers or os.cpu_count() or 1
+    pool = ExecutionPool(size=workers)
+    execute = partial(execute_python_code, pool=pool)
+    grade = partial(_grade_one, challenges=challenges_data, execute=execute, memoize=memoize)
+
+    records = []
+    started = time.perf_counter()
+    try:
+        pool.start()
+        with ThreadPoolExecutor(max_workers=workers) as threads, \
+                open(output_path, "w", encoding="utf-8") as out:
+            for record in threads.map(grade, read_submissions(input_path)):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                records.append(record)
+    finally:
+        pool.shutdown()
+
+    return summarize(records, time.perf_counter() - started)
+
+
+def main(argv=None):
+    """Command-line entry point: grade a file of challenge submissions"""
+    parser = argparse.ArgumentParser(description="Grade many challenge submissions at once")
+    parser.add_argument("input", help='JSONL file with one {"user", "challenge", "code"} object per line')
+    parser.add_argument("--output", required=True, help="JSONL file for the results")
+    parser.add_argument("--stats", help="Also write the summary to this JSON file")
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--no-memoize", dest="memoize", action="store_false",
+                        help="Run every submission even if identical code was already graded")
+    args = parser.parse_args(argv)
+
+    summary = grade_file(args.input, args.output, workers=args.workers, memoize=args.memoize)
+
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    latency = summary["latency_ms"]
+    print(f"Submissions: {summary['submissions']}")
+    print(f"Passed: {summary['passed']}")
+    print(f"Rejected before running: {summary['rejected_before_running']}")
+    print(f"Errors: {summary['errors']}")
+    print(f"Took {summary['wall_seconds']:.1f}s ({summary['submissions_per_second']} submissions/s)")
+    print(f"Latency: p50 {latency['p50']}ms, p90 {latency['p90']}ms, p99 {latency['p99']}ms, max {latency['max']}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from certificate_rules import find_certificate_type, is_eligible
+from database_manager import get_db_manager
+
+
+def _certificate_filename(username, certificate_type, fmt="png"):
+    """File name for a certificate, matching the one used for downloads"""
+    return re.sub(r'[\\/:*?"<>|]', "_", f"{username}_{certificate_type}_Certificate.{fmt}")
+
+
+def _render_certificate(task):
+    """Draw one certificate in a worker process and return (filename, file_bytes)"""
+    from certificate_render import render_certificate_file
+
+    username, certificate_type, completed_date, certificate_code, profile_data, fmt = task
+    data = render_certificate_file(
+        username, certificate_type, completed_date, certificate_code, profile_data, fmt
+    )
+    return _certificate_filename(username, certificate_type, fmt), data
+
+
+def issue_batch(certificate_type, school=None, class_name=None, section=None, output=None,
+                workers=None, total_tutorials=None, total_challenges=None, db=None, fmt="png"):
+    """
+    Issue a certificate to every eligible student of a school or class
+
+    Students who already hold the certificate are skipped. All new
+    certificates are inserted in one transaction, then drawn in parallel
+    across a process pool.
+
+    Args:
+        certificate_type (str): Name of the certificate (e.g., "Python Basics")
+        school (str, optional): Only students of this school
+        class_name (str, optional): Only students of this class
+        section (str, optional): Only students of this section
+        output (str, optional): A .zip file or a directory for the files;
+            if None, certificates are issued but not drawn
+        workers (int, optional): Number of rendering processes
+        total_tutorials (int, optional): Tutorials in the course (defaults to the content packs)
+        total_challenges (int, optional): Challenges in the course (defaults to the content packs)
+        db (DatabaseManager, optional): Database to use (defaults to db_manager)
+        fmt (str): File type of the certificates ("png", "webp" or "pdf")
+
+    Returns:
+        dict: Summary with the students considered, skipped and issued,
+            the new certificate codes and the time taken
+    """
+    db = db or get_db_manager()
+    started = time.perf_counter()
+
+    if total_tutorials is None or total_challenges is None:
+        from content_packs import course_totals
+        course_tutorials, course_challenges = course_totals()
+        total_tutorials = course_tutorials if total_tutorials is None else total_tutorials
+        total_challenges = course_challenges if total_challenges is None else total_challenges
+
+    cert_type = find_certificate_type(certificate_type, total_tutorials, total_challenges)
+    if cert_type is None:
+        raise ValueError(f"Unknown certificate type: {certificate_type}")
+
+    # Work out who earned the certificate and does not have it yet
+    users = db.get_users_with_progress(school=school, class_name=class_name, section=section)
+    holders = db.get_certificate_holders(certificate_type)
+    eligible = [
+        user for user in users
+        if user["id"] not in holders
+        and is_eligible(cert_type, user["tutorial_count"], user["challenge_count"])
+    ]
+
+    issued = db.issue_certificates([user["id"] for user in eligible], certificate_type)
+    codes = {user_id: code for user_id, code, _ in issued}
+
+    rendered = 0
+    if output and issued:
+        users_by_id = {user["id"]: user for user in eligible}
+        tasks = [
+            (
+                users_by_id[user_id]["username"], certificate_type, completed_date,
+                code, users_by_id[user_id]["profile_data"], fmt
+            )
+            for user_id, code, completed_date in issued
+        ]
+        rendered = _render_all(tasks, output, workers)
+
+    return {
+        "certificate_type": certificate_type,
+        "students": len(users),
+        "already_certified": sum(1 for user in users if user["id"] in holders),
+        "issued": len(issued),
+        "rendered": rendered,
+        "codes": codes,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def _render_all(tasks, output, workers=None):
+    """Draw certificates across a process pool into a zip file or directory"""
+    from certificate_cache import certificate_cache
+    from certificate_render import certificate_fields
+
+    to_zip = output.lower().endswith(".zip")
+    if to_zip:
+        archive = zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED)
+    else:
+        os.makedirs(output, exist_ok=True)
+
+    rendered = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+            for task, (filename, data) in zip(tasks, pool.map(_render_certificate, tasks, chunksize=chunksize)):
+                if to_zip:
+                    archive.writestr(filename, data)
+                else:
+                    with open(os.path.join(output, filename), "wb") as f:
+                        f.write(data)
+
+                # Students opening their certificates page get these for free
+                username, certificate_type, completed_date, code, profile_data, fmt = task
+                certificate_cache.put(
+                    code, certificate_fields(username, certificate_type, completed_date, profile_data), data, ext=fmt
+                )
+                rendered += 1
+    finally:
+        if to_zip:
+            archive.close()
+    return rendered
+
+
+def main(argv=None):
+    """Command-line entry point: issue certificates to a whole school or class"""
+    parser = argparse.ArgumentParser(description="Issue certificates to every eligible student at once")
+    parser.add_argument("--type", required=True, dest="certificate_type",
+                        help='Certificate to issue, e.g. "Python Basics"')
+    parser.add_argument("--school", help="Only students of this school")
+    parser.add_argument("--class", dest="class_name", help="Only students of this class")
+    parser.add_argument("--section", help="Only students of this section")
+    parser.add_argument("--output", help="Zip file or directory for the certificate images")
+    parser.add_argument("--workers", type=int, help="Number of rendering processes")
+    parser.add_argument("--format", dest="fmt", choices=["png", "webp", "pdf"], default="png",
+                        help="File type of the certificates")
+    args = parser.parse_args(argv)
+
+    summary = issue_batch(
+        args.certificate_type,
+        school=args.school,
+        class_name=args.class_name,
+        section=args.section,
+        output=args.output,
+        workers=args.workers,
+        fmt=args.fmt
+    )
+
+    print(f"Students found: {summary['students']}")
+    print(f"Already certified: {summary['already_certified']}")
+    print(f"Certificates issued: {summary['issued']}")
+    if args.output:
+        print(f"Certificates drawn: {summary['rendered']} -> {args.output}")
+    print(f"Took {summary['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
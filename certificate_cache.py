@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = "certificate_cache"
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+DIGEST_SIZE = 12
+
+
+def _safe_code(certificate_code):
+    """Make a certificate code safe to use in a file name"""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", str(certificate_code))
+
+
+def content_hash(fields):
+    """
+    Hash everything that ends up on a rendered certificate
+
+    Args:
+        fields (dict): Every input of the rendering (names, dates, profile,
+            template version, output format, ...)
+
+    Returns:
+        str: Short hex digest that changes whenever any field changes
+    """
+    payload = json.dumps(fields, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=DIGEST_SIZE).hexdigest()
+
+
+class CertificateImageCache:
+    """
+    Cache of rendered certificates, in memory and on disk
+
+    Entries are keyed by certificate code plus a hash of the rendering
+    inputs, so a changed profile or template simply produces a new key.
+    Storing a new rendering for a code removes the older ones from disk.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES):
+        """
+        Args:
+            directory (str, optional): Where rendered files are kept; None
+                keeps the cache in memory only
+            max_memory_bytes (int): Total size of renderings kept in memory
+        """
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, certificate_code, digest, ext):
+        return os.path.join(self.directory, f"{_safe_code(certificate_code)}-{digest}.{ext}")
+
+    def _remember(self, key, data):
+        """Keep data in the memory LRU (call with the lock held)"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, certificate_code, fields, ext="png"):
+        """
+        Look up a rendered certificate
+
+        Returns:
+            bytes: The cached file contents, or None if not cached
+        """
+        digest = content_hash(fields)
+        key = (certificate_code, digest, ext)
+
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.directory:
+            try:
+                with open(self._path(certificate_code, digest, ext), "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data is not None:
+                with self._lock:
+                    self._remember(key, data)
+                    self.disk_hits += 1
+                return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, certificate_code, fields, data, ext="png"):
+        """Store a rendered certificate, replacing older renderings of the same code"""
+        digest = content_hash(fields)
+        key = (certificate_code, digest, ext)
+
+        with self._lock:
+            for old_key in [k for k in self._memory if k[0] == certificate_code and k[2] == ext and k != key]:
+                self._memory_bytes -= len(self._memory.pop(old_key))
+            self._remember(key, data)
+
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(certificate_code, digest, ext)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._remove_files(certificate_code, ext, keep=os.path.basename(path))
+        except OSError as e:
+            print(f"Error caching certificate: {str(e)}")
+
+    def get_or_render(self, certificate_code, fields, render, ext="png"):
+        """
+        Return the cached certificate, rendering and storing it on a miss
+
+        Args:
+            certificate_code (str): The certificate's unique code
+            fields (dict): Every input of the rendering
+            render (function): Called with no arguments to produce the bytes
+            ext (str): File type of the rendering
+
+        Returns:
+            bytes: The rendered certificate
+        """
+        data = self.get(certificate_code, fields, ext)
+        if data is None:
+            data = render()
+            self.put(certificate_code, fields, data, ext)
+        return data
+
+    def _remove_files(self, certificate_code, ext=None, keep=None):
+        """Delete cached files of a certificate from disk"""
+        code = _safe_code(certificate_code)
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name == keep:
+                continue
+            # Names look like "<code>-<digest>.<ext>"
+            stem, _, name_ext = name.partition(".")
+            name_code, _, digest = stem.rpartition("-")
+            if name_code != code or len(digest) != DIGEST_SIZE * 2:
+                continue
+            if ext is not None and name_ext != ext:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def invalidate(self, certificate_code):
+        """Forget every rendering of a certificate"""
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == certificate_code]:
+                self._memory_bytes -= len(self._memory.pop(key))
+        if self.directory:
+            self._remove_files(certificate_code)
+
+    def stats(self):
+        """Return hit/miss counters and the memory used by the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "memory_bytes": self._memory_bytes
+            }
+
+
+# Cache shared by every session in this process
+certificate_cache = CertificateImageCache()
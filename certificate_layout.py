@@ -0,0 +1,116 @@
+# Layout of the certificate, shared by the PNG and PDF renderers.
+# Positions are in pixels of the 1200x900 PNG, measured from the top-left
+# corner; text positions are the middle of the text.
+import os
+
+WIDTH, HEIGHT = 1200, 900  # Made it taller to fit more information
+
+DARK_BLUE = (59, 89, 152)
+BLUE = (66, 133, 244)
+BLACK = (0, 0, 0)
+
+FONT_SIZES = {
+    "title": 50,
+    "subtitle": 30,
+    "body": 20,
+    "name": 40
+}
+
+DECORATION = "🐍 🚀 💻 ⭐ 🏆 "
+
+# Font shipped with the app (DejaVu Sans, see fonts/LICENSE-DejaVu.txt).
+# It covers Latin, Greek, Cyrillic, Arabic, Hebrew and more, so students'
+# names print correctly on PNG and PDF certificates alike.
+CERTIFICATE_FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "DejaVuSans.ttf")
+
+
+def static_layout():
+    """
+    Drawing steps that are the same on every certificate
+
+    Returns:
+        list: Tuples of ("rect", box, color, width), ("line", points, color, width),
+            ("text", position, text, font, color) or
+            ("decoration", position, text, font, color)
+    """
+    return [
+        # Add colorful border
+        ("rect", (20, 20, WIDTH-20, HEIGHT-20), DARK_BLUE, 10),
+        ("rect", (40, 40, WIDTH-40, HEIGHT-40), BLUE, 5),
+
+        # Add title
+        ("text", (WIDTH//2, 100), "Certificate of Achievement", "title", DARK_BLUE),
+
+        # Add decorative line
+        ("line", (WIDTH//4, 140, WIDTH*3//4, 140), BLUE, 3),
+
+        # Add certificate body
+        ("text", (WIDTH//2, 180), "This certifies that", "subtitle", BLACK),
+
+        # Add emoji decorations at the bottom
+        ("decoration", (WIDTH//2, HEIGHT-80), DECORATION, "subtitle", BLUE),
+    ]
+
+
+def student_layout(username, certificate_type, completion_date, certificate_code, profile_data=None):
+    """
+    Text drawn for one student's certificate
+
+    Returns:
+        list: ("text", position, text, font, color) tuples
+    """
+    steps = []
+
+    def text(y, value, font, color=BLACK):
+        steps.append(("text", (WIDTH//2, y), value, font, color))
+
+    # Get student full name from profile if available
+    student_name = profile_data.get('full_name', username) if profile_data else username
+
+    # Add student name (larger and more prominent)
+    text(240, f"{student_name}", "name", BLUE)
+
+    # Add student details if available
+    y_position = 300
+    if profile_data:
+        if profile_data.get('parent_name'):
+            text(y_position, f"Son/Daughter of: {profile_data.get('parent_name')}", "body")
+            y_position += 40
+
+        if profile_data.get('class') or profile_data.get('section'):
+            class_text = f"Class: {profile_data.get('class', '')}"
+            if profile_data.get('section'):
+                class_text += f", Section: {profile_data.get('section')}"
+            text(y_position, class_text, "body")
+            y_position += 40
+
+        if profile_data.get('school'):
+            text(y_position, f"School/College: {profile_data.get('school')}", "body")
+            y_position += 40
+    else:
+        y_position += 80  # Skip some space if no profile data
+
+    # Add certificate description
+    text(y_position, "has successfully completed the", "subtitle")
+    y_position += 60
+
+    # Add certificate type
+    text(y_position, f"{certificate_type}", "title", DARK_BLUE)
+    y_position += 80
+
+    # Add footer text
+    text(y_position, "Python for Kids Learning Platform", "subtitle", BLUE)
+    y_position += 60
+
+    # Add completion date
+    text(y_position, f"Completion Date: {completion_date}", "body")
+    y_position += 40
+
+    # Add certificate ID/code
+    text(y_position, f"Certificate ID: {certificate_code}", "body")
+    y_position += 40
+
+    # Add verification text
+    text(y_position, "Verify this certificate at: kidscodequiz.com/verify", "body")
+
+    return steps
@@ -0,0 +1,150 @@
+import importlib.util
+import math
+import os
+import threading
+from io import BytesIO
+
+from certificate_layout import WIDTH, HEIGHT, FONT_SIZES, CERTIFICATE_FONT, static_layout, student_layout
+
+# reportlab is optional (pip install reportlab) and only imported when a
+# PDF is actually drawn
+PDF_AVAILABLE = importlib.util.find_spec("reportlab") is not None
+
+# Points per PNG pixel: the 1200x900 layout becomes an 840x630 pt page
+PDF_SCALE = 0.7
+
+_registered_fonts = {}
+_font_lock = threading.Lock()
+
+
+def _pdf_font(font_path):
+    """
+    Register the TrueType font (embedded as a subset) once
+
+    There is deliberately no fallback to PDF's built-in Helvetica: it is
+    not embedded and only has Latin-1 characters, so names in other
+    scripts would print wrong.
+
+    Returns:
+        reportlab TTFont: The registered font
+
+    Raises:
+        OSError: If the font file is missing or cannot be read
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    font_path = font_path or CERTIFICATE_FONT
+    with _font_lock:
+        if font_path not in _registered_fonts:
+            if not os.path.isfile(font_path):
+                raise OSError(f"Certificate font not found: {font_path}")
+            name = f"CertificateFont{len(_registered_fonts)}"
+            try:
+                font = TTFont(name, font_path)
+            except Exception as e:
+                raise OSError(f"Cannot load certificate font {font_path}: {e}") from e
+            pdfmetrics.registerFont(font)
+            _registered_fonts[font_path] = font
+        return _registered_fonts[font_path]
+
+
+def _missing_characters(font, text):
+    """Characters of text that the font has no glyph for (spaces aside)"""
+    glyphs = font.face.charToGlyph
+    return sorted({c for c in text if not c.isspace() and ord(c) not in glyphs})
+
+
+def _draw_star(pdf, x, y, radius):
+    """Draw a five-pointed star centred on (x, y)"""
+    path = pdf.beginPath()
+    for i in range(10):
+        r = radius if i % 2 == 0 else radius * 0.45
+        angle = math.pi / 2 + i * math.pi / 5
+        point = (x + r * math.cos(angle), y + r * math.sin(angle))
+        if i == 0:
+            path.moveTo(*point)
+        else:
+            path.lineTo(*point)
+    path.close()
+    pdf.drawPath(path, stroke=0, fill=1)
+
+
+def render_certificate_pdf(username, certificate_type, completion_date, certificate_code,
+                           profile_data=None, font_path=None):
+    """
+    Draw a certificate as a vector PDF with the same layout as the PNG
+
+    The TrueType font is embedded (only the characters used). The emoji
+    footer is drawn as a row of stars, since PDF fonts have no emoji.
+
+    Args:
+        username (str): The username to display on the certificate
+        certificate_type (str): The type of certificate (e.g., "Python Basics")
+        completion_date (str): The date when the certificate was completed
+        certificate_code (str): The unique certificate code for verification
+        profile_data (dict): Student profile information (name, school, etc.)
+        font_path (str, optional): TrueType font to embed (default: the bundled font)
+
+    Returns:
+        bytes: The PDF document
+    """
+    if not PDF_AVAILABLE:
+        raise RuntimeError("PDF certificates need the reportlab package")
+    from reportlab.pdfgen import canvas
+
+    scale = PDF_SCALE
+    page_height = HEIGHT * scale
+    font = _pdf_font(font_path)
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=(WIDTH * scale, page_height), pageCompression=1,
+                        initialFontName=font.fontName)
+    pdf.setTitle(f"{certificate_type} Certificate")
+    pdf.setAuthor("Python for Kids Learning Platform")
+    pdf.setSubject(f"Certificate ID: {certificate_code}")
+
+    steps = static_layout() + student_layout(
+        username, certificate_type, completion_date, certificate_code, profile_data
+    )
+
+    # Say so when a name uses characters the font cannot draw, rather
+    # than silently printing empty boxes
+    missing = _missing_characters(font, "".join(step[2] for step in steps if step[0] == "text"))
+    if missing:
+        print(f"Certificate {certificate_code}: font {font.fontName} has no glyphs for {''.join(missing)!r}")
+
+    for step in steps:
+        kind = step[0]
+        if kind == "rect":
+            # PIL draws outlines inside the box, PDF strokes on the path
+            _, (x0, y0, x1, y1), color, line_width = step
+            inset = line_width / 2
+            pdf.setStrokeColorRGB(*(c / 255 for c in color))
+            pdf.setLineWidth(line_width * scale)
+            pdf.rect(
+                (x0 + inset) * scale, page_height - (y1 - inset) * scale,
+                (x1 - x0 - line_width) * scale, (y1 - y0 - line_width) * scale,
+                stroke=1, fill=0
+            )
+        elif kind == "line":
+            _, (x0, y0, x1, y1), color, line_width = step
+            pdf.setStrokeColorRGB(*(c / 255 for c in color))
+            pdf.setLineWidth(line_width * scale)
+            pdf.line(x0 * scale, page_height - y0 * scale, x1 * scale, page_height - y1 * scale)
+        elif kind == "decoration":
+            _, (x, y), _, _, color = step
+            pdf.setFillColorRGB(*(c / 255 for c in color))
+            for i in range(-2, 3):
+                _draw_star(pdf, (x + i * 50) * scale, page_height - y * scale, 12 * scale)
+        else:
+            _, (x, y), text, font_key, color = step
+            size = FONT_SIZES[font_key] * scale
+            pdf.setFont(font.fontName, size)
+            pdf.setFillColorRGB(*(c / 255 for c in color))
+            # Layout positions are text middles; move down to the baseline
+            pdf.drawCentredString(x * scale, page_height - y * scale - size * 0.35, text)
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
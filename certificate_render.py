@@ -0,0 +1,231 @@
+# Drawing and encoding of certificates, without any page code. PIL (and
+# reportlab for PDFs) is only imported when a certificate is first drawn,
+# so command-line tools and workers that never draw one start quickly.
+import threading
+from io import BytesIO
+from certificate_cache import certificate_cache
+from certificate_layout import WIDTH, HEIGHT, FONT_SIZES, CERTIFICATE_FONT, static_layout, student_layout
+from certificate_pdf import PDF_AVAILABLE, render_certificate_pdf
+
+# Bump whenever the certificate layout changes, so cached images are redrawn
+CERTIFICATE_TEMPLATE_VERSION = 2
+
+# Profile fields printed on a certificate
+PROFILE_FIELDS = ("full_name", "parent_name", "dob", "class", "section", "school")
+
+class CertificateTemplate:
+    """
+    Fonts and static artwork of the certificate, prepared once per process
+    
+    The borders, title, decorative line, opening words and emoji footer
+    are drawn a single time into a background layer. Each certificate
+    starts from a copy of that layer and only draws the student's text.
+    """
+    width, height = WIDTH, HEIGHT
+    
+    def __init__(self, font_path=None):
+        self.font_path = font_path or CERTIFICATE_FONT
+        self._fonts = None
+        self._background = None
+        self._lock = threading.Lock()
+        
+    def fonts(self):
+        """
+        Load the fonts on first use
+        
+        Raises:
+            OSError: If the font file is missing or cannot be read. PIL's
+                built-in bitmap font only has ASCII letters, so drawing with
+                it would print most students' names wrong.
+        """
+        if self._fonts is None:
+            from PIL import ImageFont
+            with self._lock:
+                if self._fonts is None:
+                    try:
+                        self._fonts = {
+                            name: ImageFont.truetype(self.font_path, size)
+                            for name, size in FONT_SIZES.items()
+                        }
+                    except OSError as e:
+                        raise OSError(f"Cannot load certificate font {self.font_path}: {e}") from e
+        return self._fonts
+        
+    def _draw(self, draw, steps):
+        """Draw layout steps onto an image"""
+        fonts = self.fonts()
+        for step in steps:
+            kind = step[0]
+            if kind == "rect":
+                _, (x0, y0, x1, y1), color, line_width = step
+                draw.rectangle(((x0, y0), (x1, y1)), outline=color, width=line_width)
+            elif kind == "line":
+                _, (x0, y0, x1, y1), color, line_width = step
+                draw.line([(x0, y0), (x1, y1)], fill=color, width=line_width)
+            else:
+                _, position, text, font, color = step
+                draw.text(position, text, fill=color, font=fonts[font], anchor="mm")
+        
+    def background(self):
+        """Draw the parts that are the same on every certificate (only once)"""
+        if self._background is None:
+            from PIL import Image, ImageDraw
+            self.fonts()
+            with self._lock:
+                if self._background is None:
+                    background = Image.new('RGB', (self.width, self.height), color=(255, 255, 255))
+                    self._draw(ImageDraw.Draw(background), static_layout())
+                    self._background = background
+        return self._background
+        
+    def render(self, username, certificate_type, completion_date, certificate_code, profile_data=None):
+        """
+        Draw one student's certificate on a copy of the background
+        
+        Returns:
+            Image: The finished certificate
+        """
+        from PIL import ImageDraw
+        certificate = self.background().copy()
+        self._draw(
+            ImageDraw.Draw(certificate),
+            student_layout(username, certificate_type, completion_date, certificate_code, profile_data)
+        )
+        return certificate
+
+# Template shared by every certificate drawn in this process
+certificate_template = CertificateTemplate()
+
+def generate_certificate_image(username, certificate_type, completion_date, certificate_code, profile_data=None):
+    """
+    Generate a certificate image for the user
+    
+    Args:
+        username (str): The username to display on the certificate
+        certificate_type (str): The type of certificate (e.g., "Python Basics")
+        completion_date (str): The date when the certificate was completed
+        certificate_code (str): The unique certificate code for verification
+        profile_data (dict): Student profile information (name, school, etc.)
+        
+    Returns:
+        BytesIO: The certificate image in a BytesIO object
+    """
+    certificate = certificate_template.render(
+        username, certificate_type, completion_date, certificate_code, profile_data
+    )
+    
+    # Save certificate to BytesIO
+    img_byte_array = BytesIO()
+    certificate.save(img_byte_array, format='PNG')
+    img_byte_array.seek(0)  # Move to the beginning of BytesIO
+    
+    return img_byte_array
+
+def certificate_fields(username, certificate_type, completion_date, profile_data=None):
+    """
+    Collect every input that changes how a certificate looks
+    
+    Returns:
+        dict: Fields used to key the certificate cache
+    """
+    profile_data = profile_data or {}
+    return {
+        "template_version": CERTIFICATE_TEMPLATE_VERSION,
+        "username": username,
+        "certificate_type": certificate_type,
+        "completion_date": completion_date,
+        "profile": {field: profile_data.get(field) or "" for field in PROFILE_FIELDS}
+    }
+
+# Output formats a certificate can be downloaded in
+CERTIFICATE_FORMATS = {
+    "png": {"label": "PNG", "mime": "image/png"},
+    "webp": {"label": "WebP (smaller file)", "mime": "image/webp"},
+}
+if PDF_AVAILABLE:
+    CERTIFICATE_FORMATS["pdf"] = {"label": "PDF (best for printing)", "mime": "application/pdf"}
+
+# Width of the lightweight preview shown on the page
+PREVIEW_WIDTH = 600
+
+def encode_certificate(certificate, fmt):
+    """
+    Encode a rendered certificate image
+    
+    Args:
+        certificate (Image): The rendered certificate
+        fmt (str): "png", "webp", or "preview" (a small WebP for the page)
+        
+    Returns:
+        bytes: The encoded file
+    """
+    from PIL import Image
+    buffer = BytesIO()
+    if fmt == "png":
+        certificate.save(buffer, format='PNG')
+    elif fmt == "webp":
+        certificate.save(buffer, format='WEBP', quality=90, method=4)
+    elif fmt == "preview":
+        height = certificate.height * PREVIEW_WIDTH // certificate.width
+        certificate.resize((PREVIEW_WIDTH, height), Image.LANCZOS).save(buffer, format='WEBP', quality=80)
+    else:
+        raise ValueError(f"Unknown certificate format: {fmt}")
+    return buffer.getvalue()
+
+def render_certificate_file(username, certificate_type, completion_date, certificate_code, profile_data=None, fmt="png"):
+    """
+    Draw and encode a certificate without using the cache
+    
+    Args:
+        fmt (str): "png", "webp", "preview" or "pdf"
+        
+    Returns:
+        bytes: The encoded certificate
+    """
+    if fmt == "pdf":
+        return render_certificate_pdf(
+            username, certificate_type, completion_date, certificate_code, profile_data,
+            font_path=certificate_template.font_path
+        )
+    return encode_certificate(
+        certificate_template.render(
+            username, certificate_type, completion_date, certificate_code, profile_data
+        ),
+        fmt
+    )
+
+def get_certificate_file(username, certificate_type, completion_date, certificate_code, profile_data=None, fmt="png"):
+    """
+    Get the certificate as a file, drawing it only if it is not cached
+    
+    Args:
+        username (str): The username to display on the certificate
+        certificate_type (str): The type of certificate (e.g., "Python Basics")
+        completion_date (str): The date when the certificate was completed
+        certificate_code (str): The unique certificate code for verification
+        profile_data (dict): Student profile information (name, school, etc.)
+        fmt (str): "png", "webp", "preview" or "pdf"
+        
+    Returns:
+        bytes: The encoded certificate
+    """
+    fields = certificate_fields(username, certificate_type, completion_date, profile_data)
+    return certificate_cache.get_or_render(
+        certificate_code,
+        fields,
+        lambda: render_certificate_file(
+            username, certificate_type, completion_date, certificate_code, profile_data, fmt
+        ),
+        ext=fmt
+    )
+
+def get_certificate_png(username, certificate_type, completion_date, certificate_code, profile_data=None):
+    """
+    Get the certificate as PNG bytes, drawing it only if it is not cached
+    
+    Returns:
+        bytes: The certificate image as PNG
+    """
+    return get_certificate_file(
+        username, certificate_type, completion_date, certificate_code, profile_data, fmt="png"
+    )
@@ -0,0 +1,132 @@
+import hashlib
+import json
+
+# Use as a requirement to mean "every tutorial" or "every challenge"
+ALL = "all"
+
+# Certificate types, easiest first. Add a tier with register_certificate_rule();
+# a requirement is a number of items or ALL.
+CERTIFICATE_RULES = []
+
+def register_certificate_rule(name, description, tutorial_req, challenge_req):
+    """
+    Add a certificate type
+
+    Args:
+        name (str): Certificate name, as stored on issued certificates
+        description (str): What the student has to do, shown on the page
+        tutorial_req (int or str): Tutorials needed, or ALL
+        challenge_req (int or str): Challenges needed, or ALL
+    """
+    if any(rule["name"] == name for rule in CERTIFICATE_RULES):
+        raise ValueError(f"Certificate type already registered: {name}")
+    CERTIFICATE_RULES.append({
+        "name": name,
+        "description": description,
+        "tutorial_req": tutorial_req,
+        "challenge_req": challenge_req
+    })
+
+register_certificate_rule("Python Basics", "Complete at least 3 tutorials and 2 challenges", 3, 2)
+register_certificate_rule("Python Junior Developer", "Complete at least 5 tutorials and 4 challenges", 5, 4)
+register_certificate_rule("Python Master", "Complete all tutorials and challenges", ALL, ALL)
+
+def get_certificate_types(total_tutorials, total_challenges):
+    """
+    Get the certificate types and what each one requires
+
+    Args:
+        total_tutorials (int): Number of tutorials in the course
+        total_challenges (int): Number of challenges in the course
+
+    Returns:
+        list: Certificate type dictionaries, easiest first
+    """
+    return [
+        dict(
+            rule,
+            tutorial_req=total_tutorials if rule["tutorial_req"] == ALL else rule["tutorial_req"],
+            challenge_req=total_challenges if rule["challenge_req"] == ALL else rule["challenge_req"]
+        )
+        for rule in CERTIFICATE_RULES
+    ]
+
+def find_certificate_type(name, total_tutorials, total_challenges):
+    """Get a certificate type by name, or None if there is no such type"""
+    for cert_type in get_certificate_types(total_tutorials, total_challenges):
+        if cert_type["name"] == name:
+            return cert_type
+    return None
+
+def is_eligible(cert_type, tutorial_count, challenge_count):
+    """Check whether a student has done enough to earn a certificate type"""
+    return (
+        tutorial_count >= cert_type["tutorial_req"] and
+        challenge_count >= cert_type["challenge_req"]
+    )
+
+def rules_signature(total_tutorials, total_challenges):
+    """Short hash of the resolved rules; stored eligibility with another signature is stale"""
+    payload = json.dumps(get_certificate_types(total_tutorials, total_challenges), sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+def evaluate_eligibility(previous, tutorial_count, challenge_count, total_tutorials, total_challenges):
+    """
+    Work out which certificate types a student is eligible for
+
+    Requirements only ever go up with progress, so when the rules are
+    unchanged and the counts have not gone down, types the student was
+    already eligible for are kept and only the others are checked.
+
+    Args:
+        previous (dict, optional): Eligibility stored earlier (as returned here)
+        tutorial_count (int): Tutorials the student has completed
+        challenge_count (int): Challenges the student has completed
+        total_tutorials (int): Number of tutorials in the course
+        total_challenges (int): Number of challenges in the course
+
+    Returns:
+        dict: {"signature", "tutorial_count", "challenge_count", "eligible"},
+            or None if previous is still up to date
+    """
+    signature = rules_signature(total_tutorials, total_challenges)
+
+    eligible = []
+    if previous and previous["signature"] == signature:
+        if (previous["tutorial_count"] == tutorial_count and
+                previous["challenge_count"] == challenge_count):
+            return None
+        if (tutorial_count >= previous["tutorial_count"] and
+                challenge_count >= previous["challenge_count"]):
+            eligible = list(previous["eligible"])
+
+    for cert_type in get_certificate_types(total_tutorials, total_challenges):
+        if cert_type["name"] not in eligible and is_eligible(cert_type, tutorial_count, challenge_count):
+            eligible.append(cert_type["name"])
+
+    return {
+        "signature": signature,
+        "tutorial_count": tutorial_count,
+        "challenge_count": challenge_count,
+        "eligible": eligible
+    }
+
+def refresh_eligibility(db, user_id, tutorial_count, challenge_count, total_tutorials, total_challenges):
+    """
+    Bring a student's stored eligibility up to date, writing only when it changed
+
+    Args:
+        db (DatabaseManager): Database holding the stored eligibility
+        user_id (int): The student's ID
+
+    Returns:
+        list: Names of the certificate types the student is eligible for
+    """
+    previous = db.get_certificate_eligibility(user_id)
+    current = evaluate_eligibility(
+        previous, tutorial_count, challenge_count, total_tutorials, total_challenges
+    )
+    if current is None:
+        return previous["eligible"]
+    db.save_certificate_eligibility(user_id, current)
+    return current["eligible"]
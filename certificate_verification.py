@@ -0,0 +1,296 @@
+import ipaddress
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# How long verification answers are reused before asking the database again
+DEFAULT_VALID_TTL = 300.0  # seconds for codes that exist
+DEFAULT_INVALID_TTL = 30.0  # seconds for codes that do not (kept short on purpose)
+DEFAULT_MAX_ENTRIES = 10000
+
+# Lookups a single client may make: a burst, then a steady rate
+DEFAULT_RATE_LIMIT = 20  # lookups allowed in a burst
+DEFAULT_RATE_PERIOD = 60.0  # seconds for the whole burst to refill
+DEFAULT_MAX_CLIENTS = 10000
+
+# Visitors whose address is unknown share one bucket, sized for all of them
+DEFAULT_SHARED_RATE_LIMIT = 200
+ANONYMOUS_CLIENT = "*"
+
+
+def parse_trusted_proxies(value):
+    """
+    Parse a comma-separated list of proxy addresses or networks
+
+    Args:
+        value (str): e.g. "10.0.0.0/8, 127.0.0.1"
+
+    Returns:
+        list: ipaddress networks
+
+    Raises:
+        ValueError: If an entry is not an address or network
+    """
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip()]
+
+# Reverse proxies in front of the app, set with the TRUSTED_PROXIES
+# environment variable. X-Forwarded-For is ignored unless this is set, and
+# it must only be set when the app cannot be reached except through them.
+TRUSTED_PROXIES = parse_trusted_proxies(os.environ.get("TRUSTED_PROXIES", ""))
+
+
+def client_address(forwarded_for, trusted_proxies=None):
+    """
+    Find the visitor's address in an X-Forwarded-For header
+
+    Each proxy appends the address it received the request from, so the
+    right-most address that is not one of our own proxies was added by
+    our proxy and is the real client. Everything to its left was sent by
+    the client and cannot be trusted.
+
+    Args:
+        forwarded_for (str): The X-Forwarded-For header, or None
+        trusted_proxies (list, optional): Networks of our proxies
+            (defaults to TRUSTED_PROXIES)
+
+    Returns:
+        str: The client's address, or None if it cannot be known
+    """
+    trusted = TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    if not trusted or not forwarded_for:
+        return None
+    for hop in reversed(forwarded_for.split(",")):
+        try:
+            address = ipaddress.ip_address(hop.strip())
+        except ValueError:
+            return None
+        if not any(address in network for network in trusted):
+            return str(address)
+    return None
+
+
+def normalize_code(certificate_code):
+    """Ignore stray spaces around a pasted certificate code"""
+    return str(certificate_code).strip()
+
+
+class VerificationCache:
+    """
+    Remembers recent certificate verification results
+
+    Valid codes are kept for valid_ttl seconds. Unknown codes are also
+    remembered (for the shorter invalid_ttl), so bots guessing random
+    codes do not reach SQLite each time.
+    """
+
+    def __init__(self, valid_ttl=DEFAULT_VALID_TTL, invalid_ttl=DEFAULT_INVALID_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        """
+        Args:
+            valid_ttl (float): Seconds to reuse the result for an existing code
+            invalid_ttl (float): Seconds to reuse the result for an unknown code
+            max_entries (int): Results kept before the oldest are dropped
+            clock (function): Time source, in seconds
+        """
+        self.valid_ttl = valid_ttl
+        self.invalid_ttl = invalid_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # code -> (expires_at, result)
+        self._lock = threading.Lock()
+
+    def get(self, certificate_code):
+        """
+        Look up a remembered result
+
+        Returns:
+            dict: The verification result, or None if unknown or expired
+        """
+        code = normalize_code(certificate_code)
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at <= self.clock():
+                del self._entries[code]
+                return None
+            self._entries.move_to_end(code)
+            if result["is_valid"]:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            return result
+
+    def put(self, certificate_code, result):
+        """Remember a verification result"""
+        code = normalize_code(certificate_code)
+        ttl = self.valid_ttl if result["is_valid"] else self.invalid_ttl
+        with self._lock:
+            self._entries[code] = (self.clock() + ttl, result)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_lookup(self, certificate_code, lookup):
+        """
+        Return the remembered result, calling lookup on a miss
+
+        Args:
+            certificate_code (str): The code entered by the visitor
+            lookup (function): Called with the code, returns the result dict
+
+        Returns:
+            dict: The verification result
+        """
+        result = self.get(certificate_code)
+        if result is None:
+            with self._lock:
+                self.misses += 1
+            result = lookup(normalize_code(certificate_code))
+            self.put(certificate_code, result)
+        return result
+
+    def invalidate(self, certificate_code):
+        """Forget the result for a code (call when a certificate is created or completed)"""
+        with self._lock:
+            self._entries.pop(normalize_code(certificate_code), None)
+
+    def clear(self):
+        """Forget every result"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the number of remembered results"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "entries": len(self._entries)
+            }
+
+
+class RateLimiter:
+    """
+    Token bucket per client
+
+    Each client may make `limit` lookups at once; the bucket then refills
+    at limit/period lookups per second.
+    """
+
+    def __init__(self, limit=DEFAULT_RATE_LIMIT, period=DEFAULT_RATE_PERIOD,
+                 max_clients=DEFAULT_MAX_CLIENTS, clock=time.monotonic):
+        """
+        Args:
+            limit (int): Lookups allowed in a burst
+            period (float): Seconds for an empty bucket to refill
+            max_clients (int): Clients tracked before the least recent are dropped
+            clock (function): Time source, in seconds
+        """
+        self.limit = limit
+        self.period = period
+        self.max_clients = max_clients
+        self.clock = clock
+        self._buckets = OrderedDict()  # client -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _tokens(self, client, now):
+        """Tokens the client has right now (call with the lock held)"""
+        tokens, updated_at = self._buckets.get(client, (self.limit, now))
+        return min(self.limit, tokens + (now - updated_at) * self.limit / self.period)
+
+    def allow(self, client):
+        """
+        Use up one lookup for a client
+
+        Returns:
+            bool: True if the lookup may go ahead, False if the client is over the limit
+        """
+        now = self.clock()
+        with self._lock:
+            tokens = self._tokens(client, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client] = (tokens, now)
+            self._buckets.move_to_end(client)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def retry_after(self, client):
+        """Seconds until the client may make another lookup"""
+        with self._lock:
+            tokens = self._tokens(client, self.clock())
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) * self.period / self.limit
+
+
+# Shared by every session in this process
+verification_cache = VerificationCache()
+verification_limiter = RateLimiter()
+session_verification_limiter = RateLimiter()
+shared_verification_limiter = RateLimiter(limit=DEFAULT_SHARED_RATE_LIMIT, max_clients=1)
+
+
+def check_verification_rate(forwarded_for, session_id=None):
+    """
+    Use up one lookup for the visitor who sent a request
+
+    Every browser session has its own bucket, so one visitor hammering the
+    page runs out long before everyone else does. On top of that, visitors
+    with a known address get their own bucket and everyone else shares
+    one, so opening new sessions or making up headers cannot get around
+    the limit.
+
+    Args:
+        forwarded_for (str): The request's X-Forwarded-For header, or None
+        session_id (str, optional): Identifies the visitor's browser session
+
+    Returns:
+        float: 0 if the lookup may go ahead, otherwise seconds to wait
+    """
+    if session_id is not None and not session_verification_limiter.allow(session_id):
+        return session_verification_limiter.retry_after(session_id)
+
+    address = client_address(forwarded_for)
+    if address is None:
+        limiter, client = shared_verification_limiter, ANONYMOUS_CLIENT
+    else:
+        limiter, client = verification_limiter, address
+    if limiter.allow(client):
+        return 0.0
+    return limiter.retry_after(client)
+
+
+def verify_certificate_code(certificate_code, lookup, forwarded_for, session_id=None):
+    """
+    Verify a code, answering from the cache when possible
+
+    Only lookups that miss the cache count against the rate limits, so a
+    popular shared link keeps working however often it is opened.
+
+    Args:
+        certificate_code (str): The code entered by the visitor
+        lookup (function): Called with the code on a cache miss, returns the result dict
+        forwarded_for (str): The request's X-Forwarded-For header, or None
+        session_id (str, optional): Identifies the visitor's browser session
+
+    Returns:
+        tuple: (result dict or None, seconds to wait) - the result is None
+            when the visitor is over the limit
+    """
+    result = verification_cache.get(certificate_code)
+    if result is not None:
+        return result, 0.0
+    wait = check_verification_rate(forwarded_for, session_id)
+    if wait:
+        return None, wait
+    return verification_cache.get_or_lookup(certificate_code, lookup), 0.0
@@ -1,51 +1,453 @@
-import streamlit as st
 import sys
-from io import StringIO
+import ast
+import builtins
+import contextvars
+import functools
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 import traceback
 
-def execute_python_code(code):
+# Limits on how much output a single run may produce
+DEFAULT_MAX_OUTPUT_CHARS = 20000
+DEFAULT_MAX_OUTPUT_LINES = 1000
+
+# How often streamed output is handed to the on_output callback
+OUTPUT_FLUSH_CHARS = 4096
+OUTPUT_FLUSH_INTERVAL = 0.1  # seconds
+
+TRUNCATION_NOTICE = "\n... ✋ Your code printed so much that we stopped it here! Try printing fewer lines."
+
+# How many compiled programs each process keeps around
+DEFAULT_CODE_CACHE_SIZE = 256
+
+# How many results of deterministic programs to remember
+DEFAULT_RESULT_CACHE_SIZE = 512
+
+# The output sink of the run happening in the current thread (None outside a run)
+_current_output = contextvars.ContextVar("current_output", default=None)
+_router_lock = threading.Lock()
+
+class _OutputRouter:
+    """
+    Stand-in for sys.stdout that sends writes to the output sink of the
+    run happening in the current thread, and everything else to the real stdout
+    """
+    def __init__(self, fallback):
+        self._fallback = fallback
+        
+    def _target(self):
+        sink = _current_output.get()
+        return sink if sink is not None else self._fallback
+        
+    def write(self, text):
+        return self._target().write(text)
+        
+    def flush(self):
+        return self._target().flush()
+        
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+class OutputLimitExceeded(BaseException):
+    """
+    Raised inside student code when it prints more than the output limit
+    
+    Derived from BaseException so a bare `except Exception` in student
+    code does not swallow it and keep the run going.
+    """
+
+class BoundedOutput:
+    """
+    Output sink that keeps at most max_chars characters and max_lines lines
+    
+    Writes past either limit are cut off and stop the run with
+    OutputLimitExceeded. If on_output is given, captured text is also
+    handed to it in chunks while the code is still running.
+    """
+    def __init__(self, max_chars=DEFAULT_MAX_OUTPUT_CHARS, max_lines=DEFAULT_MAX_OUTPUT_LINES, on_output=None):
+        self.max_chars = max_chars
+        self.max_lines = max_lines
+        self.on_output = on_output
+        self.truncated = False
+        self._parts = []
+        self._chars = 0
+        self._lines = 0
+        self._pending = []
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        
+    def write(self, text):
+        if self.truncated:
+            raise OutputLimitExceeded()
+        
+        # Cut the text at whichever limit it reaches first
+        keep = min(len(text), self.max_chars - self._chars)
+        new_lines = text.count("\n", 0, keep)
+        remaining_lines = self.max_lines - self._lines
+        if new_lines >= remaining_lines:
+            cut = -1
+            for _ in range(remaining_lines):
+                cut = text.index("\n", cut + 1)
+            if cut + 1 < keep:
+                keep = cut + 1
+                new_lines = remaining_lines
+        
+        if keep:
+            self._append(text[:keep])
+            self._lines += new_lines
+        
+        if keep < len(text):
+            self.truncated = True
+            self.flush()
+            raise OutputLimitExceeded()
+        
+        if self._pending_chars >= OUTPUT_FLUSH_CHARS or time.monotonic() - self._last_flush >= OUTPUT_FLUSH_INTERVAL:
+            self.flush()
+        return len(text)
+        
+    def _append(self, text):
+        self._parts.append(text)
+        self._chars += len(text)
+        if self.on_output is not None:
+            self._pending.append(text)
+            self._pending_chars += len(text)
+            
+    def flush(self):
+        """Hand any output not yet streamed to the on_output callback"""
+        self._last_flush = time.monotonic()
+        if self._pending:
+            text = "".join(self._pending)
+            self._pending = []
+            self._pending_chars = 0
+            self.on_output(text)
+            
+    def getvalue(self):
+        """Return everything captured so far"""
+        return "".join(self._parts)
+
+def _install_output_router():
+    """Put the output router in place of sys.stdout (only once per process)"""
+    if isinstance(sys.stdout, _OutputRouter):
+        return
+    with _router_lock:
+        if not isinstance(sys.stdout, _OutputRouter):
+            sys.stdout = _OutputRouter(sys.stdout)
+
+@contextmanager
+def capture_output(sink):
+    """
+    Send everything printed by the current thread to sink
+    
+    Other threads keep printing to their own sinks (or the real stdout),
+    so many runs can capture output at the same time.
+    
+    Args:
+        sink: A file-like object with a write() method
+    """
+    _install_output_router()
+    token = _current_output.set(sink)
+    try:
+        yield sink
+    finally:
+        _current_output.reset(token)
+
+def _end_program(code=None):
+    """
+    exit() and quit() for student code: end the program like sys.exit()
+    
+    The site module's versions also close sys.stdin, which belongs to the
+    app (or the worker), not to the student's program.
+    """
+    raise SystemExit(code)
+
+def _fresh_globals(sink):
+    """Build a new global namespace for one run, with print going to sink"""
+    run_builtins = dict(builtins.__dict__)
+    run_builtins["print"] = functools.partial(print, file=sink)
+    run_builtins["exit"] = run_builtins["quit"] = _end_program
+    return {"__name__": "__main__", "__builtins__": run_builtins}
+
+def source_hash(code):
+    """Return a short, stable hash identifying a piece of source code"""
+    return hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+class LRUCache:
+    """Small thread-safe LRU mapping with hit/miss counters"""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def get(self, key):
+        """Return the value stored for key (counting a hit), or None (counting a miss)"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+            
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries)
+            }
+        
+    def clear(self):
+        """Forget every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+class CompiledCodeCache(LRUCache):
+    """
+    LRU cache of compiled programs keyed by a hash of their source
+    
+    Code that does not compile is cached too, together with its
+    kid-friendly error message, so it is never parsed twice either.
+    """
+    def __init__(self, maxsize=DEFAULT_CODE_CACHE_SIZE):
+        super().__init__(maxsize)
+        
+    def compile(self, code):
+        """
+        Compile code, reusing an earlier result for identical source
+        
+        Args:
+            code (str): Python code to compile
+            
+        Returns:
+            tuple: (code_object, error) where exactly one is None
+        """
+        key = source_hash(code)
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        
+        try:
+            entry = (compile(code, "<string>", "exec"), None)
+        except (SyntaxError, ValueError) as e:
+            entry = (None, simplify_error(f"{type(e).__name__}: {e}"))
+        except (RecursionError, MemoryError) as e:
+            # Very long or deeply nested expressions overflow the parser itself
+            entry = (None, simplify_error(f"{type(e).__name__}: your code is too long or too deeply nested for Python to read"))
+        except Exception as e:
+            entry = (None, simplify_error(f"{type(e).__name__}: {e}"))
+        
+        self.put(key, entry)
+        return entry
+
+# Cache shared by every run in this process
+code_cache = CompiledCodeCache()
+
+# Modules whose functions always give the same answer for the same input
+DETERMINISTIC_MODULES = {
+    "math", "string", "itertools", "functools", "operator",
+    "collections", "fractions", "decimal", "statistics"
+}
+
+# Built-in functions whose results can change from run to run (or process
+# to process), plus set displays whose order depends on string hashing
+NONDETERMINISTIC_CALLS = {
+    "input", "open", "id", "hash", "set", "frozenset", "eval", "exec",
+    "compile", "__import__", "globals", "locals", "vars", "breakpoint",
+    "object"
+}
+
+# Calls that turn a value into printed text
+TEXT_CALLS = {"print", "str", "repr", "format", "ascii"}
+
+# Default reprs of functions, classes' instances and other objects include
+# their memory address ("<function f at 0x7f...>"), which changes every run
+ADDRESS_IN_OUTPUT = re.compile(r" at 0x[0-9a-fA-F]+")
+
+def _prints_object_address(tree):
+    """Check whether code prints a function, class, lambda or instance of its own class"""
+    # Names the program binds to functions and classes it defines
+    defined = {
+        node.name for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+    classes = {node.name for node in ast.walk(tree) if isinstance(node, ast.ClassDef)}
+    
+    def has_address(value):
+        # f(3) and A.value use a definition without printing it
+        used = set()
+        for node in ast.walk(value):
+            if isinstance(node, ast.Call):
+                used.add(id(node.func))
+            elif isinstance(node, ast.Attribute):
+                used.add(id(node.value))
+        return any(
+            isinstance(node, ast.Lambda) or
+            (isinstance(node, ast.Name) and node.id in defined and id(node) not in used) or
+            (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in classes)
+            for node in ast.walk(value)
+        )
+    
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in TEXT_CALLS:
+            if any(has_address(arg) for arg in node.args):
+                return True
+        elif isinstance(node, ast.FormattedValue) and has_address(node.value):
+            return True
+    return False
+
+def is_deterministic(code):
+    """
+    Check, without running it, whether code always prints the same thing
+    
+    The check is deliberately strict: any import outside
+    DETERMINISTIC_MODULES (random, time, datetime, ...), any call to a
+    name in NONDETERMINISTIC_CALLS, any set literal, and printing a
+    function, lambda or object (whose repr holds a memory address) makes
+    the program count as non-deterministic.
+    
+    Args:
+        code (str): Python code to check
+        
+    Returns:
+        bool: True if the output only depends on the source code
+    """
+    try:
+        tree = ast.parse(code)
+    except Exception:
+        return False
+    
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(alias.name.split(".")[0] not in DETERMINISTIC_MODULES for alias in node.names):
+                return False
+        elif isinstance(node, ast.ImportFrom):
+            if node.level or (node.module or "").split(".")[0] not in DETERMINISTIC_MODULES:
+                return False
+        elif isinstance(node, (ast.Set, ast.SetComp)):
+            return False
+        elif isinstance(node, ast.Name) and node.id in NONDETERMINISTIC_CALLS:
+            return False
+        elif isinstance(node, ast.Attribute) and node.attr.startswith("__"):
+            return False
+    return not _prints_object_address(tree)
+
+# Results of deterministic programs, keyed by source hash
+result_cache = LRUCache(DEFAULT_RESULT_CACHE_SIZE)
+
+def execute_python_code(code, sandboxed=True, on_output=None, memoize=False, pool=None):
     """
     Execute Python code and return output and any errors
     
     Args:
         code (str): Python code to execute
+        sandboxed (bool): Run the code in a worker process from the shared
+            execution pool (with time and memory limits) instead of in
+            the current thread
+        on_output (function, optional): Called with chunks of output
+            while the code is still running
+        memoize (bool): Reuse the earlier result of identical source if
+            is_deterministic() says the program always prints the same thing
+        pool (ExecutionPool, optional): Pool for sandboxed runs (defaults
+            to the shared one)
         
     Returns:
         tuple: (output, error)
     """
-    # Create StringIO objects for capturing stdout
-    stdout_capture = StringIO()
+    # Code that does not compile never needs a worker
+    compiled, error = code_cache.compile(code)
+    if error:
+        return "", error
+    
+    if memoize:
+        key = source_hash(code)
+        result = result_cache.get(key)
+        if result is not None:
+            if on_output is not None and result[0]:
+                on_output(result[0])
+            return result
+        
+        if is_deterministic(code):
+            result = execute_python_code(code, sandboxed=sandboxed, on_output=on_output, pool=pool)
+            if _is_repeatable_result(result):
+                result_cache.put(key, result)
+            return result
+    
+    if sandboxed:
+        if pool is None:
+            from execution_pool import get_execution_pool
+            pool = get_execution_pool()
+        return pool.run(code, on_output=on_output)
     
-    # Store the original stdout
-    original_stdout = sys.stdout
+    # Each run gets its own bounded output sink, so parallel runs never mix output
+    stdout_capture = BoundedOutput(on_output=on_output)
     
     output = ""
-    error = None
     
     try:
-        # Redirect stdout
-        sys.stdout = stdout_capture
-        
-        # Execute the code
-        exec(code)
+        # Execute the code in its own namespace
+        with capture_output(stdout_capture):
+            try:
+                exec(compiled, _fresh_globals(stdout_capture))
+            except OutputLimitExceeded:
+                pass
+            except SystemExit as e:
+                # exit() / sys.exit() just end the program early; like
+                # Python, show a message passed instead of an exit code
+                if e.code is not None and not isinstance(e.code, int):
+                    try:
+                        print(e.code, file=stdout_capture)
+                    except OutputLimitExceeded:
+                        pass
         
         # Get the captured output
         output = stdout_capture.getvalue()
+        if stdout_capture.truncated:
+            output += TRUNCATION_NOTICE
         
     except Exception as e:
         # Get the full traceback
         error_msg = traceback.format_exc()
         
         # Simplify the error message for kids
-        simple_error = simplify_error(str(e))
+        simple_error = simplify_error(f"{type(e).__name__}: {e}")
         error = simple_error
         
     finally:
-        # Restore stdout
-        sys.stdout = original_stdout
+        # Stream whatever is left
+        if on_output is not None:
+            stdout_capture.flush()
         
     return output, error
 
+def _is_repeatable_result(result):
+    """
+    Check that a result came from the code itself, not from a limit or a
+    busy pool, and holds no memory addresses the AST check missed
+    """
+    from execution_pool import POOL_ERRORS
+    output, error = result
+    return error not in POOL_ERRORS and not ADDRESS_IN_OUTPUT.search(output or "")
+
 def simplify_error(error_message):
     """
     Simplify Python error messages to be more kid-friendly
@@ -77,3 +479,20 @@ def simplify_error(error_message):
     
     # If we don't recognize the error, return a generic message with the original error
     return f"Oops! Something went wrong: {error_message}"
+
+def error_class(error):
+    """
+    Get the kind of error from a message made by execute_python_code
+    
+    Args:
+        error (str): The error message, or None
+        
+    Returns:
+        str: e.g. "NameError" or "TimeoutError"; "Error" if the message
+            does not say; None if there was no error
+    """
+    if not error:
+        return None
+    # Known errors end in "(NameError)", others start with "...went wrong: RuntimeError:"
+    match = re.search(r"\((\w+)\)\s*$", error) or re.search(r"went wrong: (\w+):", error)
+    return match.group(1) if match else "Error"
@@ -0,0 +1,279 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from types import MappingProxyType
+
+# Tutorials and challenges live in content packs, not in Python code:
+#
+#   content/<pack>/pack.json        titles, code, hints and grading specs
+#   content/<pack>/tutorials/*.md   long markdown bodies
+#   content/<pack>/challenges/*.md
+#
+# Every item has a stable "id" (used in pack files and URLs) and an
+# "index" (its position in the course, which is what progress and stored
+# submissions refer to). Packs are loaded once per process into a
+# read-only registry that every session shares; markdown bodies are only
+# read when a page first needs them.
+
+DEFAULT_CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+
+# How often (in seconds) pack files are checked for changes
+RELOAD_CHECK_INTERVAL = 2.0
+
+CONTENT_KINDS = ("tutorials", "challenges")
+
+# Fields whose value is a markdown file, read on first use
+LAZY_FIELDS = {
+    "tutorials": {"content": "content_file"},
+    "challenges": {"description": "description_file"},
+}
+
+
+class ContentItem(Mapping):
+    """
+    One read-only tutorial or challenge
+
+    Behaves like the dictionaries the pages used before (item["title"],
+    item["grading"], ...). Markdown bodies are read from disk on first
+    access and then kept.
+    """
+
+    def __init__(self, kind, fields, lazy_files):
+        """
+        Args:
+            kind (str): "tutorials" or "challenges"
+            fields (dict): Values loaded from pack.json
+            lazy_files (dict): Field name -> path of its markdown file
+        """
+        self.kind = kind
+        self.id = fields["id"]
+        self.index = fields["index"]
+        self._fields = MappingProxyType(fields)
+        self._lazy_files = MappingProxyType(lazy_files)
+        self._loaded = {}
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return self._fields[key]
+        if key not in self._lazy_files:
+            raise KeyError(key)
+        if key not in self._loaded:
+            with open(self._lazy_files[key], "r", encoding="utf-8") as f:
+                self._loaded[key] = f.read()
+        return self._loaded[key]
+
+    def __iter__(self):
+        yield from self._fields
+        yield from self._lazy_files
+
+    def __len__(self):
+        return len(self._fields) + len(self._lazy_files)
+
+    def __repr__(self):
+        return f"<ContentItem {self.kind}/{self.id} #{self.index}>"
+
+
+class ContentRegistry:
+    """Every tutorial and challenge of the course, by index and by id"""
+
+    def __init__(self, items, signature=None):
+        """
+        Args:
+            items (dict): Kind -> list of ContentItem
+            signature (tuple, optional): Pack file state the registry was loaded from
+
+        Raises:
+            ValueError: If ids repeat or indexes are not 0, 1, 2, ...
+        """
+        self.signature = signature
+        self._by_index = {}
+        self._index_of = {}
+        for kind in CONTENT_KINDS:
+            ordered = sorted(items.get(kind, []), key=lambda item: item.index)
+            if [item.index for item in ordered] != list(range(len(ordered))):
+                raise ValueError(f"{kind} indexes must be 0 to {len(ordered) - 1} with no gaps or repeats")
+            index_of = {}
+            for item in ordered:
+                if item.id in index_of:
+                    raise ValueError(f"Duplicate {kind} id: {item.id}")
+                index_of[item.id] = item.index
+            self._by_index[kind] = tuple(ordered)
+            self._index_of[kind] = MappingProxyType(index_of)
+
+    def by_index(self, kind, index):
+        """Get an item by its position in the course (raises IndexError)"""
+        return self._by_index[kind][index]
+
+    def get(self, kind, item_id):
+        """Get an item by id, or None if there is no such item"""
+        index = self._index_of[kind].get(item_id)
+        return None if index is None else self._by_index[kind][index]
+
+    def index_of(self, kind, item_id):
+        """Position of the item with this id, or None"""
+        return self._index_of[kind].get(item_id)
+
+    def items(self, kind):
+        """All items of a kind, in course order"""
+        return self._by_index[kind]
+
+    def count(self, kind):
+        """Number of items of a kind"""
+        return len(self._by_index[kind])
+
+
+def _pack_dirs(directory):
+    """Pack directories (those with a pack.json), in name order"""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name) for name in sorted(os.listdir(directory))
+        if os.path.isfile(os.path.join(directory, name, "pack.json"))
+    ]
+
+def content_signature(directory=DEFAULT_CONTENT_DIR):
+    """
+    Cheap fingerprint of every pack file (paths, sizes and modification times)
+
+    Returns:
+        tuple: Changes whenever a pack file is added, removed or edited
+    """
+    state = []
+    for pack_dir in _pack_dirs(directory):
+        for root, dirs, files in os.walk(pack_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state.append((path, stat.st_size, stat.st_mtime_ns))
+    return tuple(state)
+
+def _load_pack(pack_dir, items):
+    """Read one pack.json into items (kind -> list of ContentItem)"""
+    from grading import compile_grading
+
+    with open(os.path.join(pack_dir, "pack.json"), "r", encoding="utf-8") as f:
+        pack = json.load(f)
+
+    for kind in CONTENT_KINDS:
+        for entry in pack.get(kind, []):
+            fields = dict(entry)
+            lazy_files = {}
+            for field, file_key in LAZY_FIELDS[kind].items():
+                if file_key in fields:
+                    path = os.path.join(pack_dir, fields.pop(file_key))
+                    if not os.path.isfile(path):
+                        raise ValueError(f"{kind} {fields.get('id')!r}: missing file {path}")
+                    lazy_files[field] = path
+            if not isinstance(fields.get("id"), str) or not isinstance(fields.get("index"), int):
+                raise ValueError(f"Every item in {kind} needs a string id and an integer index")
+            # Validators are compiled once here, not on every grading run
+            if "grading" in fields:
+                fields["grading"] = compile_grading(fields["grading"])
+            fields["pack"] = pack.get("id", os.path.basename(pack_dir))
+            items[kind].append(ContentItem(kind, fields, lazy_files))
+
+def load_registry(directory=DEFAULT_CONTENT_DIR):
+    """
+    Load every content pack in a directory
+
+    Args:
+        directory (str): Directory holding one subdirectory per pack
+
+    Returns:
+        ContentRegistry: The loaded content
+
+    Raises:
+        ValueError: If a pack is malformed (bad ids or indexes, missing files, unknown checks)
+    """
+    signature = content_signature(directory)
+    items = {kind: [] for kind in CONTENT_KINDS}
+    for pack_dir in _pack_dirs(directory):
+        try:
+            _load_pack(pack_dir, items)
+        except (OSError, KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Could not load content pack {pack_dir}: {e}") from e
+    return ContentRegistry(items, signature)
+
+
+# Shared registry for this process; loaded on first use
+_registry = None
+_registry_dir = DEFAULT_CONTENT_DIR
+_last_check = 0.0
+_failed_signature = None  # pack state that last failed to load, not retried until it changes
+_registry_lock = threading.Lock()
+
+def get_content_registry(directory=None, reload_interval=RELOAD_CHECK_INTERVAL):
+    """
+    Get the shared content registry, reloading it if pack files changed
+
+    Pack files are checked at most every reload_interval seconds. If a
+    changed pack fails to load, the error is printed and the previous
+    content stays in use.
+
+    Args:
+        directory (str, optional): Use packs from this directory instead
+        reload_interval (float): Seconds between checks, or None to never reload
+
+    Returns:
+        ContentRegistry: The current content
+    """
+    global _registry, _registry_dir, _last_check, _failed_signature
+
+    with _registry_lock:
+        if directory is not None and directory != _registry_dir:
+            _registry, _registry_dir = None, directory
+        if _registry is None:
+            _registry = load_registry(_registry_dir)
+            _last_check = time.monotonic()
+            return _registry
+
+        now = time.monotonic()
+        if reload_interval is not None and now - _last_check >= reload_interval:
+            _last_check = now
+            signature = content_signature(_registry_dir)
+            if signature not in (_registry.signature, _failed_signature):
+                try:
+                    _registry = load_registry(_registry_dir)
+                except ValueError as e:
+                    _failed_signature = signature
+                    print(f"Error reloading content packs, keeping the previous content: {e}")
+        return _registry
+
+
+class ContentView(Sequence):
+    """
+    Live, read-only list of one kind of content
+
+    Indexing and len() always go to the current registry, so pages and
+    tools see reloaded packs without holding their own copy.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def __getitem__(self, index):
+        items = get_content_registry().items(self.kind)
+        return items[index]
+
+    def __len__(self):
+        return get_content_registry().count(self.kind)
+
+    def get(self, item_id):
+        """Get an item by id, or None"""
+        return get_content_registry().get(self.kind, item_id)
+
+    def index_of(self, item_id):
+        """Position of the item with this id, or None"""
+        return get_content_registry().index_of(self.kind, item_id)
+
+
+def course_totals():
+    """Number of tutorials and challenges in the course, as a (tutorials, challenges) tuple"""
+    registry = get_content_registry()
+    return registry.count("tutorials"), registry.count("challenges")
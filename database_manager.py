@@ -1,30 +1,741 @@
 import sqlite3
 import os
 import json
-from datetime import datetime
+import atexit
+import queue
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import threading
 
+# Queries run on almost every page view; check_query_plans() makes sure
+# none of them has to scan a whole table
+GET_USER_SQL = """
+    SELECT id, username, password_hash, full_name, parent_name, 
+    dob, class, section, school
+    FROM users WHERE username = ?
+"""
+
+GET_USER_PROGRESS_SQL = """
+    SELECT points, completed_tutorials, completed_challenges, emoji_collection, version
+    FROM user_progress WHERE user_id = ?
+"""
+
+GET_USER_EVENTS_SQL = """
+    SELECT event_type, event_details, timestamp 
+    FROM user_events 
+    WHERE user_id = ? 
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+GET_USER_CERTIFICATES_SQL = """
+    SELECT certificate_type, issue_date, certificate_code, completed_date
+    FROM certificates
+    WHERE user_id = ?
+    ORDER BY issue_date DESC
+"""
+
+VERIFY_CERTIFICATE_SQL = """
+    SELECT c.certificate_type, c.issue_date, c.completed_date, u.username,
+           u.full_name, u.parent_name, u.dob, u.class, u.section, u.school, u.id
+    FROM certificates c
+    JOIN users u ON c.user_id = u.id
+    WHERE c.certificate_code = ?
+"""
+
+GET_USER_POINTS_SQL = """
+    SELECT points, version FROM user_progress WHERE user_id = ?
+"""
+
+GET_PROGRESS_COUNTERS_SQL = """
+    SELECT points, tutorial_count, challenge_count, version
+    FROM user_progress WHERE user_id = ?
+"""
+
+GET_USER_COMPLETIONS_SQL = """
+    SELECT item_type, item_id FROM user_completions
+    WHERE user_id = ?
+    ORDER BY id
+"""
+
+GET_USER_EMOJIS_SQL = """
+    SELECT emoji FROM user_emojis
+    WHERE user_id = ?
+    ORDER BY id
+"""
+
+GET_ITEM_COMPLETIONS_SQL = """
+    SELECT user_id, completed_at FROM user_completions
+    WHERE item_type = ? AND item_id = ?
+    ORDER BY completed_at
+"""
+
+# The same two answers when completions are kept as JSON lists in
+# user_progress ({column} is completed_tutorials or completed_challenges).
+# These read every progress row, and the lists do not record when each
+# item was completed, so the row's last update stands in for it.
+COUNT_JSON_COMPLETIONS_SQL = """
+    SELECT CAST(j.value AS INTEGER), COUNT(DISTINCT p.user_id)
+    FROM user_progress p, json_each(COALESCE(p.{column}, '[]')) j
+    GROUP BY CAST(j.value AS INTEGER)
+"""
+
+GET_JSON_ITEM_COMPLETIONS_SQL = """
+    SELECT p.user_id, p.last_updated FROM user_progress p
+    WHERE EXISTS (SELECT 1 FROM json_each(COALESCE(p.{column}, '[]')) WHERE value = ?)
+    ORDER BY p.last_updated
+"""
+
+GET_CERTIFICATE_ELIGIBILITY_SQL = """
+    SELECT rules_signature, tutorial_count, challenge_count, eligible
+    FROM certificate_eligibility WHERE user_id = ?
+"""
+
+GET_LAST_SUBMISSION_SQL = """
+    SELECT code, output_hash, error_class, duration_ms, verdict, created_at
+    FROM submissions
+    WHERE user_id = ? AND item_type = ? AND item_id = ?
+    ORDER BY id DESC
+    LIMIT 1
+"""
+
+GET_USER_SUBMISSIONS_SQL = """
+    SELECT item_type, item_id, code, output_hash, error_class, duration_ms, verdict, created_at
+    FROM submissions
+    WHERE user_id = ?
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+GET_LEADERBOARD_TOP_SQL = """
+    SELECT m.user_id, u.username, u.full_name, m.points
+    FROM leaderboard_members m
+    JOIN users u ON u.id = m.user_id
+    WHERE m.scope = ? AND m.scope_key = ?
+    ORDER BY m.points DESC, m.user_id
+    LIMIT ?
+"""
+
+GET_LEADERBOARD_MEMBER_SQL = """
+    SELECT scope_key, points FROM leaderboard_members
+    WHERE user_id = ? AND scope = ?
+"""
+
+# One row per distinct score, so a rank costs one short range read however
+# many students share the leaderboard
+GET_LEADERBOARD_RANK_SQL = """
+    SELECT COALESCE(SUM(CASE WHEN points > ? THEN students ELSE 0 END), 0), COALESCE(SUM(students), 0)
+    FROM leaderboard_scores
+    WHERE scope = ? AND scope_key = ?
+"""
+
+# Hot queries with sample parameters, as used by check_query_plans()
+HOT_QUERIES = {
+    "get_user": (GET_USER_SQL, ("username",)),
+    "get_user_progress": (GET_USER_PROGRESS_SQL, (1,)),
+    "get_user_points": (GET_USER_POINTS_SQL, (1,)),
+    "get_progress_counters": (GET_PROGRESS_COUNTERS_SQL, (1,)),
+    "get_user_completions": (GET_USER_COMPLETIONS_SQL, (1,)),
+    "get_user_emojis": (GET_USER_EMOJIS_SQL, (1,)),
+    "get_item_completions": (GET_ITEM_COMPLETIONS_SQL, ("challenge", 4)),
+    "get_user_events": (GET_USER_EVENTS_SQL, (1, 50)),
+    "get_user_certificates": (GET_USER_CERTIFICATES_SQL, (1,)),
+    "verify_certificate": (VERIFY_CERTIFICATE_SQL, ("code",)),
+    "get_certificate_eligibility": (GET_CERTIFICATE_ELIGIBILITY_SQL, (1,)),
+    "get_last_submission": (GET_LAST_SUBMISSION_SQL, (1, "challenge", 4)),
+    "get_user_submissions": (GET_USER_SUBMISSIONS_SQL, (1, 50)),
+    "get_leaderboard_top": (GET_LEADERBOARD_TOP_SQL, ("class", '["school", "5"]', 10)),
+    "get_leaderboard_member": (GET_LEADERBOARD_MEMBER_SQL, (1, "class")),
+    "get_leaderboard_rank": (GET_LEADERBOARD_RANK_SQL, (10, "class", '["school", "5"]')),
+}
+
+def _add_missing_profile_columns(cursor):
+    """Add the student profile columns to users tables created before they existed"""
+    cursor.execute("PRAGMA table_info(users)")
+    existing = {row[1] for row in cursor.fetchall()}
+    for column in ("full_name", "parent_name", "dob", "class", "section", "school"):
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE users ADD COLUMN "{column}" TEXT')
+
+# Kinds of items a student can complete, as stored in user_completions
+COMPLETION_TYPES = {
+    "completed_tutorials": "tutorial",
+    "completed_challenges": "challenge",
+}
+
+# Column of user_progress counting each kind of completion
+COMPLETION_COUNTERS = {
+    "tutorial": "tutorial_count",
+    "challenge": "challenge_count",
+}
+
+def _backfill_completions(cursor):
+    """Copy the JSON progress lists into the normalized completion tables"""
+    cursor.execute(
+        """
+        SELECT user_id, completed_tutorials, completed_challenges, emoji_collection, last_updated
+        FROM user_progress ORDER BY id
+        """
+    )
+    completions = []
+    emojis = []
+    for user_id, tutorials, challenges, emoji_collection, last_updated in cursor.fetchall():
+        for column, items in (("completed_tutorials", tutorials), ("completed_challenges", challenges)):
+            for item_id in json.loads(items or "[]"):
+                completions.append((user_id, COMPLETION_TYPES[column], item_id, last_updated))
+        for emoji in json.loads(emoji_collection or "[]"):
+            emojis.append((user_id, emoji, last_updated))
+    
+    cursor.executemany(
+        "INSERT OR IGNORE INTO user_completions (user_id, item_type, item_id, completed_at) VALUES (?, ?, ?, ?)",
+        completions
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO user_emojis (user_id, emoji, earned_at) VALUES (?, ?, ?)",
+        emojis
+    )
+
+def _backfill_progress_counters(cursor):
+    """Fill in the completion counters of existing progress rows"""
+    # Whichever store was in use (JSON lists or completion rows) holds at
+    # least as many items as the other one, so take the larger count
+    for column, item_type in COMPLETION_TYPES.items():
+        counter = COMPLETION_COUNTERS[item_type]
+        cursor.execute(
+            f"""
+            UPDATE user_progress SET {counter} = MAX(
+                json_array_length(COALESCE({column}, '[]')),
+                (SELECT COUNT(*) FROM user_completions c
+                 WHERE c.user_id = user_progress.user_id AND c.item_type = ?)
+            )
+            """,
+            (item_type,)
+        )
+
+# Leaderboards a student appears on, and the profile columns that pick
+# which one; a student whose school, class or section is blank is left off
+# the leaderboards that need it
+LEADERBOARD_SCOPES = {
+    "school": ("school",),
+    "class": ("school", "class"),
+    "section": ("school", "class", "section"),
+}
+
+def leaderboard_keys(profile):
+    """
+    Work out which leaderboards a student belongs to
+    
+    Args:
+        profile (dict): The student's school, class and section
+        
+    Returns:
+        dict: Scope -> leaderboard key, for the scopes the profile fills in
+    """
+    keys = {}
+    for scope, columns in LEADERBOARD_SCOPES.items():
+        values = [str(profile.get(column) or "").strip() for column in columns]
+        if all(values):
+            keys[scope] = json.dumps(values, ensure_ascii=False)
+    return keys
+
+def _join_leaderboards(cursor, user_id, profile, points):
+    """Put a student on the leaderboards of their school, class and section"""
+    for scope, key in leaderboard_keys(profile).items():
+        cursor.execute(
+            "INSERT OR IGNORE INTO leaderboard_members (user_id, scope, scope_key, points) VALUES (?, ?, ?, ?)",
+            (user_id, scope, key, points)
+        )
+        if cursor.rowcount == 1:
+            _count_score(cursor, scope, key, points, 1)
+
+def _count_score(cursor, scope, key, points, change):
+    """Add change (1 or -1) to the number of students on a leaderboard with this score"""
+    cursor.execute(
+        """
+        INSERT INTO leaderboard_scores (scope, scope_key, points, students) VALUES (?, ?, ?, ?)
+        ON CONFLICT (scope, scope_key, points) DO UPDATE SET students = students + excluded.students
+        """,
+        (scope, key, points, change)
+    )
+    if change < 0:
+        cursor.execute(
+            "DELETE FROM leaderboard_scores WHERE scope = ? AND scope_key = ? AND points = ? AND students <= 0",
+            (scope, key, points)
+        )
+
+def _move_on_leaderboards(cursor, user_id, points):
+    """Update a student's score on every leaderboard they are on"""
+    cursor.execute("SELECT scope, scope_key, points FROM leaderboard_members WHERE user_id = ?", (user_id,))
+    for scope, key, old_points in cursor.fetchall():
+        if old_points == points:
+            continue
+        cursor.execute(
+            "UPDATE leaderboard_members SET points = ? WHERE user_id = ? AND scope = ?",
+            (points, user_id, scope)
+        )
+        _count_score(cursor, scope, key, old_points, -1)
+        _count_score(cursor, scope, key, points, 1)
+
+def _backfill_leaderboards(cursor):
+    """Put every existing student on their leaderboards"""
+    cursor.execute(
+        """
+        SELECT u.id, u.school, u.class, u.section, COALESCE(p.points, 0)
+        FROM users u LEFT JOIN user_progress p ON p.user_id = u.id
+        """
+    )
+    for user_id, school, class_name, section, points in cursor.fetchall():
+        _join_leaderboards(cursor, user_id, {"school": school, "class": class_name, "section": section}, points)
+
+# Schema changes applied in order by DatabaseManager.migrate_schema(). The
+# database's PRAGMA user_version records the last version applied; each
+# step is a SQL statement or a function taking a cursor.
+SCHEMA_MIGRATIONS = [
+    (1, "Add student profile columns to older databases", [
+        _add_missing_profile_columns,
+    ]),
+    (2, "Index per-user lookups", [
+        # Older databases may hold duplicate progress rows (they were always
+        # updated together), so keep only the first one per user
+        """
+        DELETE FROM user_progress
+        WHERE id NOT IN (SELECT MIN(id) FROM user_progress GROUP BY user_id)
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_user ON user_progress (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_events_user_time ON user_events (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_certificates_user_issue ON certificates (user_id, issue_date)",
+    ]),
+    (3, "Store completions and emojis one row per item", [
+        """
+        CREATE TABLE IF NOT EXISTS user_completions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            item_type TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, item_type, item_id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+        # Per-user indexes also hold the rowid, so reads come back in insert order
+        "CREATE INDEX IF NOT EXISTS idx_user_completions_user ON user_completions (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_completions_item ON user_completions (item_type, item_id, completed_at)",
+        """
+        CREATE TABLE IF NOT EXISTS user_emojis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            emoji TEXT NOT NULL,
+            earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, emoji),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_user_emojis_user ON user_emojis (user_id)",
+        _backfill_completions,
+    ]),
+    (4, "Store each student's certificate eligibility", [
+        # Filled in when progress is saved (or the certificate page finds it
+        # stale), so there is nothing to backfill
+        """
+        CREATE TABLE IF NOT EXISTS certificate_eligibility (
+            user_id INTEGER PRIMARY KEY,
+            rules_signature TEXT NOT NULL,
+            tutorial_count INTEGER NOT NULL,
+            challenge_count INTEGER NOT NULL,
+            eligible TEXT NOT NULL DEFAULT '[]',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+    ]),
+    (5, "Keep every code submission", [
+        # Append-only: rows are never updated, so the id gives the order
+        """
+        CREATE TABLE IF NOT EXISTS submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            item_type TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            output_hash TEXT,
+            error_class TEXT,
+            duration_ms REAL,
+            verdict TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_submissions_user_item ON submissions (user_id, item_type, item_id)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_user ON submissions (user_id)",
+    ]),
+    (6, "Version progress rows and count completions on them", [
+        # version goes up by one on every change, so a whole-row save can
+        # tell whether someone else changed the row since it was read
+        "ALTER TABLE user_progress ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE user_progress ADD COLUMN tutorial_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE user_progress ADD COLUMN challenge_count INTEGER NOT NULL DEFAULT 0",
+        _backfill_progress_counters,
+    ]),
+    (7, "Keep school, class and section leaderboards", [
+        # Kept up to date whenever points change, so showing a leaderboard
+        # never sorts every student
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_members (
+            user_id INTEGER NOT NULL,
+            scope TEXT NOT NULL,
+            scope_key TEXT NOT NULL,
+            points INTEGER NOT NULL,
+            PRIMARY KEY (user_id, scope),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_members_rank ON leaderboard_members (scope, scope_key, points DESC, user_id)",
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_scores (
+            scope TEXT NOT NULL,
+            scope_key TEXT NOT NULL,
+            points INTEGER NOT NULL,
+            students INTEGER NOT NULL,
+            PRIMARY KEY (scope, scope_key, points)
+        )
+        """,
+        _backfill_leaderboards,
+    ]),
+]
+
+# Adds to a user's counters in one statement, creating the progress row if
+# needed, and returns the new values
+BUMP_PROGRESS_SQL = """
+    INSERT INTO user_progress (user_id, points, tutorial_count, challenge_count, version)
+    VALUES (?, ?, ?, ?, 1)
+    ON CONFLICT (user_id) DO UPDATE SET
+        points = points + excluded.points,
+        tutorial_count = tutorial_count + excluded.tutorial_count,
+        challenge_count = challenge_count + excluded.challenge_count,
+        version = version + 1,
+        last_updated = CURRENT_TIMESTAMP
+    RETURNING points, tutorial_count, challenge_count, version
+"""
+
+
+def _sqlite_timestamp():
+    """Current UTC time in the same format as SQLite's CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+INSERT_EVENT_SQL = "INSERT INTO user_events (user_id, event_type, event_details, timestamp) VALUES (?, ?, ?, ?)"
+
+INSERT_SUBMISSION_SQL = """
+    INSERT INTO submissions
+    (user_id, item_type, item_id, code, output_hash, error_class, duration_ms, verdict, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Longest code stored with a submission; anything after it is cut off so
+# one huge paste cannot bloat the submissions table
+MAX_SUBMISSION_CODE_CHARS = 256 * 1024
+TRUNCATED_CODE_NOTICE = "\n# ... (the rest of this code was too long to save)\n"
+
+class BufferedEventWriter:
+    """
+    Writes user events from a background thread in batches
+    
+    Events are queued in memory and inserted with one executemany per
+    batch, when batch_size events are waiting or flush_interval seconds
+    have passed. The queue is bounded: when it is full, "drop" discards
+    the new event (counted in dropped) and "block" waits up to
+    block_timeout seconds for room before dropping it.
+    
+    Other append-only rows (such as submissions) can be written the same
+    way by passing their insert_sql and queuing rows with put().
+    """
+    def __init__(self, db, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 full_policy="drop", block_timeout=0.5, insert_sql=INSERT_EVENT_SQL,
+                 name="event-writer"):
+        self.db = db
+        self.insert_sql = insert_sql
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        
+    def start(self):
+        """Start the background writer thread"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                
+    def log(self, user_id, event_type, event_details=None):
+        """
+        Queue an event to be written
+        
+        Returns:
+            bool: False if the queue was full and the event was dropped
+        """
+        return self.put((user_id, event_type, event_details, _sqlite_timestamp()))
+        
+    def put(self, row):
+        """
+        Queue a row for insert_sql
+        
+        Returns:
+            bool: False if the queue was full and the row was dropped
+        """
+        try:
+            if self.full_policy == "block":
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+            
+    def flush(self, timeout=5.0):
+        """
+        Wait until every event queued so far has been written
+        
+        Waits at most timeout seconds in total, even if the queue is full
+        and the writer is stalled, so a page is never held up for long.
+        
+        Returns:
+            bool: False if the events were not all written in time
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(max(0.0, deadline - time.monotonic()))
+        
+    def close(self, timeout=5.0):
+        """Write any queued events and stop the background thread"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print(f"Could not stop {self.name} in time; queued rows were not written")
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        
+    def _run(self):
+        """Background loop: collect events into batches and write them"""
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            
+            if isinstance(item, tuple) and item:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            
+            # Batch is full, the interval passed, or a flush/stop was requested
+            self._write(batch)
+            batch = []
+            deadline = None
+            
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                self.db.close()
+                return
+                
+    def _write(self, batch):
+        """Insert a batch of rows in one transaction, or row by row if the batch fails"""
+        if not batch:
+            return
+        try:
+            with self.db.transaction() as cursor:
+                cursor.executemany(self.insert_sql, batch)
+            self.written += len(batch)
+            return
+        except Exception as e:
+            print(f"Error writing {len(batch)} rows ({self.name}), retrying one by one: {str(e)}")
+        
+        # One bad row must not lose the others
+        for row in batch:
+            try:
+                with self.db.transaction() as cursor:
+                    cursor.execute(self.insert_sql, row)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error writing row ({self.name}): {str(e)}")
+
 class DatabaseManager:
-    def __init__(self, db_name="kids_python_app.db"):
-        """Initialize the database connection"""
+    def __init__(self, db_name="kids_python_app.db", persistent=False,
+                 busy_timeout_ms=5000, cache_size_kb=16384, normalized_progress=False):
+        """
+        Initialize the database connection
+        
+        Args:
+            db_name (str): Path of the SQLite database file
+            persistent (bool): Keep one long-lived connection per thread
+                (in WAL mode) instead of opening and closing one per call
+            busy_timeout_ms (int): How long to wait for a locked database
+            cache_size_kb (int): Page cache size for each connection
+            normalized_progress (bool): Keep completed tutorials, challenges
+                and emojis as one row per item (user_completions and
+                user_emojis) instead of JSON lists in user_progress. The
+                JSON lists are copied over once by a schema migration and
+                are not updated in this mode.
+        """
         self.db_name = db_name
+        self.persistent = persistent
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.normalized_progress = normalized_progress
         self._local = threading.local()
+        # Long-lived connections by thread id, so they can be closed when
+        # their thread ends or on shutdown
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        self.event_writer = None
+        self.submission_writer = None
         self.initialize_database()
         
     def connect(self):
         """Connect to the database in a thread-safe way"""
         if not hasattr(self._local, 'conn') or self._local.conn is None:
-            self._local.conn = sqlite3.connect(self.db_name)
+            if self.persistent:
+                self._local.conn = self._open_persistent_connection()
+            else:
+                self._local.conn = sqlite3.connect(self.db_name)
             self._local.cursor = self._local.conn.cursor()
         return self._local.conn, self._local.cursor
         
+    def _open_persistent_connection(self):
+        """Open and tune a connection that stays open for the life of this thread"""
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        
+        thread = threading.current_thread()
+        with self._connections_lock:
+            self._close_dead_thread_connections()
+            self._connections[thread.ident] = (weakref.ref(thread), conn)
+        return conn
+        
+    def _close_dead_thread_connections(self):
+        """Close connections whose threads have finished (call with the lock held)"""
+        for ident, (thread_ref, conn) in list(self._connections.items()):
+            thread = thread_ref()
+            if thread is None or not thread.is_alive():
+                del self._connections[ident]
+                conn.close()
+        
     def disconnect(self):
-        """Disconnect from the database"""
+        """
+        Disconnect from the database
+        
+        In persistent mode the connection stays open for the next call;
+        only work that was never committed is rolled back.
+        """
+        # Leave the connection alone while a transaction is still open
+        if getattr(self._local, 'tx_depth', 0):
+            return
+        
+        if self.persistent:
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            return
+        self.close()
+        
+    def close(self):
+        """Close this thread's connection"""
         if hasattr(self._local, 'conn') and self._local.conn is not None:
+            with self._connections_lock:
+                self._connections.pop(threading.get_ident(), None)
             self._local.conn.close()
             self._local.conn = None
             self._local.cursor = None
             
+    def close_all(self):
+        """Close every long-lived connection, e.g. when the app shuts down"""
+        with self._connections_lock:
+            connections = [conn for _, conn in self._connections.values()]
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+            
+    @contextmanager
+    def transaction(self):
+        """
+        Run a group of statements as one atomic unit of work
+        
+        Everything executed inside the block is committed together when
+        the outermost block exits, or rolled back if it raises. Methods
+        that write (log_event, create_certificate, ...) use this too, so
+        calling them inside a block makes them part of the same commit.
+        Nested blocks use savepoints: an error inside one that is caught
+        by the caller only undoes that block's statements.
+        
+        Yields:
+            sqlite3.Cursor: Cursor for this thread's connection
+        """
+        conn, cursor = self.connect()
+        depth = getattr(self._local, 'tx_depth', 0)
+        savepoint = f"tx_{depth}"
+        
+        if depth:
+            cursor.execute(f"SAVEPOINT {savepoint}")
+        elif not conn.in_transaction:
+            # Open the transaction explicitly, otherwise releasing the first
+            # nested savepoint would commit on its own
+            cursor.execute("BEGIN")
+        self._local.tx_depth = depth + 1
+        
+        try:
+            yield cursor
+        except BaseException:
+            if depth:
+                cursor.execute(f"ROLLBACK TO {savepoint}")
+                cursor.execute(f"RELEASE {savepoint}")
+            else:
+                conn.rollback()
+            raise
+        else:
+            if depth:
+                cursor.execute(f"RELEASE {savepoint}")
+            else:
+                conn.commit()
+        finally:
+            self._local.tx_depth = depth
+            if not depth:
+                self.disconnect()
+            
     def initialize_database(self):
         """Create database tables if they don't exist"""
         conn, cursor = self.connect()
@@ -88,6 +799,53 @@ class DatabaseManager:
         conn.commit()
         self.disconnect()
         
+        self.migrate_schema()
+        
+    def schema_version(self):
+        """Return the last schema migration applied to the database"""
+        conn, cursor = self.connect()
+        try:
+            cursor.execute("PRAGMA user_version")
+            return cursor.fetchone()[0]
+        finally:
+            self.disconnect()
+        
+    def migrate_schema(self):
+        """Apply any schema migrations the database does not have yet"""
+        version = self.schema_version()
+        for target, description, steps in SCHEMA_MIGRATIONS:
+            if target <= version:
+                continue
+            with self.transaction() as cursor:
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(f"PRAGMA user_version = {int(target)}")
+            version = target
+            
+    def check_query_plans(self):
+        """
+        Run EXPLAIN QUERY PLAN on every hot query and report full table scans
+        
+        Returns:
+            dict: Query name -> list of plan steps that scan a table
+                (empty when every query is served by an index)
+        """
+        conn, cursor = self.connect()
+        try:
+            report = {}
+            for name, (sql, params) in HOT_QUERIES.items():
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                report[name] = [
+                    row[3] for row in cursor.fetchall()
+                    if row[3].startswith("SCAN") or "TEMP B-TREE" in row[3]
+                ]
+            return report
+        finally:
+            self.disconnect()
+        
     # User management functions
     def add_user(self, username, password_hash, profile_data=None):
         """
@@ -98,63 +856,57 @@ class DatabaseManager:
             password_hash (str): Hashed password
             profile_data (dict, optional): Dictionary containing user profile information
         """
-        conn, cursor = self.connect()
         try:
-            if profile_data:
-                cursor.execute(
-                    """
-                    INSERT INTO users (
-                        username, password_hash, full_name, parent_name, 
-                        dob, class, section, school
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        username, password_hash, 
-                        profile_data.get('full_name', ''),
-                        profile_data.get('parent_name', ''),
-                        profile_data.get('dob', ''),
-                        profile_data.get('class', ''),
-                        profile_data.get('section', ''),
-                        profile_data.get('school', '')
+            # The user, their progress row and the event are one commit
+            with self.transaction() as cursor:
+                if profile_data:
+                    cursor.execute(
+                        """
+                        INSERT INTO users (
+                            username, password_hash, full_name, parent_name, 
+                            dob, class, section, school
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            username, password_hash, 
+                            profile_data.get('full_name', ''),
+                            profile_data.get('parent_name', ''),
+                            profile_data.get('dob', ''),
+                            profile_data.get('class', ''),
+                            profile_data.get('section', ''),
+                            profile_data.get('school', '')
+                        )
                     )
-                )
-            else:
+                else:
+                    cursor.execute(
+                        "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                        (username, password_hash)
+                    )
+                
+                user_id = cursor.lastrowid
+                
+                # Create an empty progress record for the user
                 cursor.execute(
-                    "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-                    (username, password_hash)
+                    "INSERT INTO user_progress (user_id) VALUES (?)",
+                    (user_id,)
                 )
-            
-            user_id = cursor.lastrowid
-            
-            # Create an empty progress record for the user
-            cursor.execute(
-                "INSERT INTO user_progress (user_id) VALUES (?)",
-                (user_id,)
-            )
-            
-            # Log user creation event
-            self.log_event(user_id, "user_created", f"User account created for {username}")
-            
-            conn.commit()
-            return user_id
+                
+                # Start at the bottom of their school, class and section leaderboards
+                _join_leaderboards(cursor, user_id, profile_data or {}, 0)
+                
+                # Log user creation event
+                self.log_event(user_id, "user_created", f"User account created for {username}")
+                
+                return user_id
         except sqlite3.IntegrityError:
             # Username already exists
             return None
-        finally:
-            self.disconnect()
             
     def get_user(self, username):
         """Get user details by username"""
         conn, cursor = self.connect()
         try:
-            cursor.execute(
-                """
-                SELECT id, username, password_hash, full_name, parent_name, 
-                dob, class, section, school
-                FROM users WHERE username = ?
-                """,
-                (username,)
-            )
+            cursor.execute(GET_USER_SQL, (username,))
             user = cursor.fetchone()
             if user:
                 return {
@@ -174,101 +926,383 @@ class DatabaseManager:
             
     def update_last_login(self, user_id):
         """Update user's last login timestamp"""
-        conn, cursor = self.connect()
-        try:
+        with self.transaction() as cursor:
             cursor.execute(
                 "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
                 (user_id,)
             )
-            conn.commit()
-        finally:
-            self.disconnect()
             
     # Progress tracking functions
     def get_user_progress(self, user_id):
         """Get user's progress"""
+        if self.normalized_progress:
+            return self._get_normalized_progress(user_id)
+        
         conn, cursor = self.connect()
         try:
-            cursor.execute(
-                "SELECT points, completed_tutorials, completed_challenges, emoji_collection FROM user_progress WHERE user_id = ?",
-                (user_id,)
-            )
+            cursor.execute(GET_USER_PROGRESS_SQL, (user_id,))
             progress = cursor.fetchone()
             if progress:
                 return {
                     "points": progress[0],
                     "completed_tutorials": json.loads(progress[1]),
                     "completed_challenges": json.loads(progress[2]),
-                    "emoji_collection": json.loads(progress[3])
+                    "emoji_collection": json.loads(progress[3]),
+                    "version": progress[4]
                 }
             return {
                 "points": 0,
                 "completed_tutorials": [],
                 "completed_challenges": [],
-                "emoji_collection": []
+                "emoji_collection": [],
+                "version": 0
             }
         finally:
             self.disconnect()
             
-    def update_user_progress(self, user_id, points, completed_tutorials, completed_challenges, emoji_collection):
-        """Update user's progress"""
+    def _get_normalized_progress(self, user_id):
+        """Build the progress dictionary from the per-item completion tables"""
         conn, cursor = self.connect()
         try:
-            cursor.execute(
-                """
-                UPDATE user_progress 
-                SET points = ?, 
-                    completed_tutorials = ?, 
-                    completed_challenges = ?, 
-                    emoji_collection = ?,
-                    last_updated = CURRENT_TIMESTAMP
-                WHERE user_id = ?
-                """,
-                (
-                    points, 
-                    json.dumps(completed_tutorials), 
-                    json.dumps(completed_challenges), 
-                    json.dumps(emoji_collection),
-                    user_id
-                )
+            cursor.execute(GET_USER_POINTS_SQL, (user_id,))
+            row = cursor.fetchone()
+            progress = {
+                "points": row[0] if row else 0,
+                "completed_tutorials": [],
+                "completed_challenges": [],
+                "emoji_collection": [],
+                "version": row[1] if row else 0
+            }
+            
+            keys = {item_type: key for key, item_type in COMPLETION_TYPES.items()}
+            cursor.execute(GET_USER_COMPLETIONS_SQL, (user_id,))
+            for item_type, item_id in cursor.fetchall():
+                progress[keys[item_type]].append(item_id)
+            
+            cursor.execute(GET_USER_EMOJIS_SQL, (user_id,))
+            progress["emoji_collection"] = [row[0] for row in cursor.fetchall()]
+            return progress
+        finally:
+            self.disconnect()
+            
+    def update_user_progress(self, user_id, points, completed_tutorials, completed_challenges, emoji_collection,
+                             expected_version=None):
+        """
+        Replace a user's whole progress
+        
+        Prefer the single-item changes (award_points, mark_item_completed,
+        add_emoji) when something was earned; this is for imports and resets.
+        
+        Args:
+            expected_version (int, optional): Only save if the progress is
+                still at this version (as returned by get_user_progress),
+                i.e. nobody changed it since it was read
+        
+        Returns:
+            bool: False on error or if the version did not match
+        """
+        if self.normalized_progress:
+            return self._update_normalized_progress(
+                user_id, points, completed_tutorials, completed_challenges, emoji_collection,
+                expected_version
             )
-            conn.commit()
+        
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE user_progress 
+                    SET points = ?, 
+                        completed_tutorials = ?, 
+                        completed_challenges = ?, 
+                        emoji_collection = ?,
+                        tutorial_count = ?,
+                        challenge_count = ?,
+                        version = version + 1,
+                        last_updated = CURRENT_TIMESTAMP
+                    WHERE user_id = ? AND (? IS NULL OR version = ?)
+                    """,
+                    (
+                        points, 
+                        json.dumps(completed_tutorials), 
+                        json.dumps(completed_challenges), 
+                        json.dumps(emoji_collection),
+                        len(completed_tutorials),
+                        len(completed_challenges),
+                        user_id,
+                        expected_version,
+                        expected_version
+                    )
+                )
+                if expected_version is not None and cursor.rowcount == 0:
+                    return False
+                _move_on_leaderboards(cursor, user_id, points)
             return True
         except Exception as e:
             print(f"Error updating progress: {str(e)}")
             return False
+            
+    def _update_normalized_progress(self, user_id, points, completed_tutorials, completed_challenges, emoji_collection,
+                                    expected_version=None):
+        """Make the completion tables match the given lists (rows are only added or removed)"""
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE user_progress
+                    SET points = ?, tutorial_count = ?, challenge_count = ?,
+                        version = version + 1, last_updated = CURRENT_TIMESTAMP
+                    WHERE user_id = ? AND (? IS NULL OR version = ?)
+                    """,
+                    (points, len(completed_tutorials), len(completed_challenges),
+                     user_id, expected_version, expected_version)
+                )
+                if expected_version is not None and cursor.rowcount == 0:
+                    return False
+                _move_on_leaderboards(cursor, user_id, points)
+                for key, items in (("completed_tutorials", completed_tutorials),
+                                   ("completed_challenges", completed_challenges)):
+                    item_type = COMPLETION_TYPES[key]
+                    cursor.execute(
+                        f"""
+                        DELETE FROM user_completions
+                        WHERE user_id = ? AND item_type = ?
+                        AND item_id NOT IN ({",".join("?" * len(items))})
+                        """,
+                        (user_id, item_type, *items)
+                    )
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO user_completions (user_id, item_type, item_id) VALUES (?, ?, ?)",
+                        [(user_id, item_type, item_id) for item_id in items]
+                    )
+                cursor.execute(
+                    f"""
+                    DELETE FROM user_emojis
+                    WHERE user_id = ? AND emoji NOT IN ({",".join("?" * len(emoji_collection))})
+                    """,
+                    (user_id, *emoji_collection)
+                )
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO user_emojis (user_id, emoji) VALUES (?, ?)",
+                    [(user_id, emoji) for emoji in emoji_collection]
+                )
+            return True
+        except Exception as e:
+            print(f"Error updating progress: {str(e)}")
+            return False
+            
+    # Single-item progress changes. Each one is a couple of statements that
+    # touch only the rows involved, in one transaction, so two tabs of the
+    # same student cannot overwrite each other's progress.
+    def _bump_progress(self, cursor, user_id, points=0, tutorials=0, challenges=0):
+        """Add to a user's counters and version; returns the new counters"""
+        cursor.execute(BUMP_PROGRESS_SQL, (user_id, points, tutorials, challenges))
+        row = cursor.fetchone()
+        if points:
+            _move_on_leaderboards(cursor, user_id, row[0])
+        return {"points": row[0], "tutorial_count": row[1], "challenge_count": row[2], "version": row[3]}
+        
+    def _add_to_json_list(self, cursor, user_id, column, value):
+        """Append a value to a JSON list column unless it is already there; True if added"""
+        cursor.execute(
+            f"""
+            UPDATE user_progress SET {column} = json_insert(COALESCE({column}, '[]'), '$[#]', ?)
+            WHERE user_id = ?
+            AND NOT EXISTS (SELECT 1 FROM json_each(COALESCE(user_progress.{column}, '[]')) WHERE value = ?)
+            """,
+            (value, user_id, value)
+        )
+        return cursor.rowcount == 1
+        
+    def get_progress_counters(self, user_id):
+        """
+        Get a user's points, completion counts and progress version
+        
+        Returns:
+            dict: points, tutorial_count, challenge_count and version (all 0 if there is no progress yet)
+        """
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(GET_PROGRESS_COUNTERS_SQL, (user_id,))
+            row = cursor.fetchone() or (0, 0, 0, 0)
+            return {"points": row[0], "tutorial_count": row[1], "challenge_count": row[2], "version": row[3]}
+        finally:
+            self.disconnect()
+            
+    def award_points(self, user_id, points, raise_errors=False):
+        """
+        Add points to a user's total
+        
+        Args:
+            user_id (int): The user's ID
+            points (int): Points to add
+            raise_errors (bool): Raise database errors instead of printing
+                them, so an enclosing transaction is rolled back rather than
+                committed without the points
+        
+        Returns:
+            dict: The new counters (see get_progress_counters), or None on error
+        """
+        try:
+            with self.transaction() as cursor:
+                return self._bump_progress(cursor, user_id, points=points)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error awarding points: {str(e)}")
+            return None
+            
+    def mark_item_completed(self, user_id, item_type, item_id, points=0):
+        """
+        Record that a user completed one tutorial or challenge
+        
+        The points are only awarded, and the completion only counted, the
+        first time, so marking the same item twice (e.g. from two tabs) is harmless.
+        
+        Args:
+            user_id (int): The user's ID
+            item_type (str): "tutorial" or "challenge"
+            item_id (int): Index of the tutorial or challenge
+            points (int): Points the completion is worth
+            
+        Returns:
+            bool: True if this is a new completion
+        """
+        with self.transaction() as cursor:
+            if self.normalized_progress:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO user_completions (user_id, item_type, item_id) VALUES (?, ?, ?)",
+                    (user_id, item_type, item_id)
+                )
+                is_new = cursor.rowcount == 1
+            else:
+                column = {value: key for key, value in COMPLETION_TYPES.items()}[item_type]
+                is_new = self._add_to_json_list(cursor, user_id, column, item_id)
+            
+            if is_new:
+                counter = COMPLETION_COUNTERS[item_type]
+                self._bump_progress(
+                    cursor, user_id, points=points,
+                    tutorials=int(counter == "tutorial_count"),
+                    challenges=int(counter == "challenge_count")
+                )
+            return is_new
+            
+    def add_emoji(self, user_id, emoji):
+        """
+        Add an emoji to a user's collection
+        
+        Returns:
+            bool: True if the user did not have it yet
+        """
+        with self.transaction() as cursor:
+            if self.normalized_progress:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO user_emojis (user_id, emoji) VALUES (?, ?)",
+                    (user_id, emoji)
+                )
+                is_new = cursor.rowcount == 1
+            else:
+                is_new = self._add_to_json_list(cursor, user_id, "emoji_collection", emoji)
+            if is_new:
+                self._bump_progress(cursor, user_id)
+            return is_new
+            
+    def get_item_completions(self, item_type, item_id):
+        """
+        Get every user who completed a tutorial or challenge
+        
+        Without normalized_progress, completed_at is when the user's
+        progress last changed (the JSON lists keep no completion times).
+        
+        Returns:
+            list: Dictionaries with user_id and completed_at, oldest first
+        """
+        conn, cursor = self.connect()
+        try:
+            if self.normalized_progress:
+                cursor.execute(GET_ITEM_COMPLETIONS_SQL, (item_type, item_id))
+            else:
+                column = {value: key for key, value in COMPLETION_TYPES.items()}[item_type]
+                cursor.execute(GET_JSON_ITEM_COMPLETIONS_SQL.format(column=column), (item_id,))
+            return [
+                {"user_id": row[0], "completed_at": row[1]}
+                for row in cursor.fetchall()
+            ]
+        finally:
+            self.disconnect()
+            
+    def count_completions(self, item_type):
+        """
+        Count how many users completed each tutorial or challenge
+        
+        Returns:
+            dict: Item index -> number of users who completed it
+        """
+        conn, cursor = self.connect()
+        try:
+            if self.normalized_progress:
+                cursor.execute(
+                    """
+                    SELECT item_id, COUNT(*) FROM user_completions
+                    WHERE item_type = ?
+                    GROUP BY item_id
+                    """,
+                    (item_type,)
+                )
+            else:
+                column = {value: key for key, value in COMPLETION_TYPES.items()}[item_type]
+                cursor.execute(COUNT_JSON_COMPLETIONS_SQL.format(column=column))
+            return dict(cursor.fetchall())
         finally:
             self.disconnect()
             
     # Event logging
+    def start_event_writer(self, **options):
+        """
+        Write events logged outside a transaction from a background thread
+        
+        Args:
+            **options: Settings passed on to BufferedEventWriter
+            
+        Returns:
+            BufferedEventWriter: The running writer
+        """
+        if self.event_writer is None:
+            self.event_writer = BufferedEventWriter(self, **options)
+            self.event_writer.start()
+            atexit.register(self.event_writer.close)
+        return self.event_writer
+        
     def log_event(self, user_id, event_type, event_details=None):
-        """Log a user event"""
-        conn, cursor = self.connect()
+        """
+        Log a user event
+        
+        Inside a transaction the event is part of that commit. Otherwise it
+        is handed to the background event writer if one is running.
+        """
+        if self.event_writer is not None and not getattr(self._local, 'tx_depth', 0):
+            self.event_writer.log(user_id, event_type, event_details)
+            return
+        
         try:
-            cursor.execute(
-                "INSERT INTO user_events (user_id, event_type, event_details) VALUES (?, ?, ?)",
-                (user_id, event_type, event_details)
-            )
-            conn.commit()
+            with self.transaction() as cursor:
+                cursor.execute(
+                    "INSERT INTO user_events (user_id, event_type, event_details) VALUES (?, ?, ?)",
+                    (user_id, event_type, event_details)
+                )
         except Exception as e:
             print(f"Error logging event: {str(e)}")
-        finally:
-            self.disconnect()
                 
     def get_user_events(self, user_id, limit=50):
         """Get recent events for a user"""
+        # Make sure events still waiting in the buffer are included
+        if self.event_writer is not None:
+            self.event_writer.flush()
+        
         conn, cursor = self.connect()
         try:
-            cursor.execute(
-                """
-                SELECT event_type, event_details, timestamp 
-                FROM user_events 
-                WHERE user_id = ? 
-                ORDER BY timestamp DESC
-                LIMIT ?
-                """,
-                (user_id, limit)
-            )
+            cursor.execute(GET_USER_EVENTS_SQL, (user_id, limit))
             events = cursor.fetchall()
             return [
                 {
@@ -281,87 +1315,324 @@ class DatabaseManager:
         finally:
             self.disconnect()
             
+    # Code submissions
+    def start_submission_writer(self, **options):
+        """
+        Write submissions from a background thread, off the request path
+        
+        Args:
+            **options: Settings passed on to BufferedEventWriter
+            
+        Returns:
+            BufferedEventWriter: The running writer
+        """
+        if self.submission_writer is None:
+            self.submission_writer = BufferedEventWriter(
+                self, insert_sql=INSERT_SUBMISSION_SQL, name="submission-writer", **options
+            )
+            self.submission_writer.start()
+            atexit.register(self.submission_writer.close)
+        return self.submission_writer
+        
+    def record_submission(self, user_id, item_type, item_id, code, output_hash=None,
+                          error_class=None, duration_ms=None, verdict="ran"):
+        """
+        Store one run of a student's code
+        
+        Args:
+            user_id (int): The student's ID
+            item_type (str): "tutorial" or "challenge"
+            item_id (int): Index of the tutorial or challenge
+            code (str): The code that was run (cut off after
+                MAX_SUBMISSION_CODE_CHARS characters)
+            output_hash (str, optional): Hash of what the code printed
+            error_class (str, optional): Kind of error, e.g. "NameError"
+            duration_ms (float, optional): How long the run took
+            verdict (str): "passed", "failed", "rejected", "error" or "ran"
+        """
+        if len(code) > MAX_SUBMISSION_CODE_CHARS:
+            code = code[:MAX_SUBMISSION_CODE_CHARS] + TRUNCATED_CODE_NOTICE
+        row = (user_id, item_type, item_id, code, output_hash, error_class,
+               duration_ms, verdict, _sqlite_timestamp())
+        if self.submission_writer is not None:
+            self.submission_writer.put(row)
+            return
+        
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(INSERT_SUBMISSION_SQL, row)
+        except Exception as e:
+            print(f"Error recording submission: {str(e)}")
+            
+    def _submission_dict(self, row):
+        return {
+            "code": row[0],
+            "output_hash": row[1],
+            "error_class": row[2],
+            "duration_ms": row[3],
+            "verdict": row[4],
+            "created_at": row[5]
+        }
+        
+    def get_last_submission(self, user_id, item_type, item_id):
+        """
+        Get a student's most recent run of a tutorial or challenge
+        
+        Returns:
+            dict: code, output_hash, error_class, duration_ms, verdict and
+                created_at, or None if they never ran it
+        """
+        # Make sure runs still waiting in the buffer are included
+        if self.submission_writer is not None:
+            self.submission_writer.flush()
+        
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(GET_LAST_SUBMISSION_SQL, (user_id, item_type, item_id))
+            row = cursor.fetchone()
+            return self._submission_dict(row) if row else None
+        finally:
+            self.disconnect()
+            
+    def get_user_submissions(self, user_id, limit=50):
+        """Get a student's most recent runs, newest first"""
+        if self.submission_writer is not None:
+            self.submission_writer.flush()
+        
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(GET_USER_SUBMISSIONS_SQL, (user_id, limit))
+            return [
+                dict(self._submission_dict(row[2:]), item_type=row[0], item_id=row[1])
+                for row in cursor.fetchall()
+            ]
+        finally:
+            self.disconnect()
+            
     # Certificate management
     def create_certificate(self, user_id, certificate_type):
         """Create a certificate for a user"""
         import uuid
         certificate_code = str(uuid.uuid4())
         
-        conn, cursor = self.connect()
         try:
-            cursor.execute(
-                """
-                INSERT INTO certificates 
-                (user_id, certificate_type, certificate_code) 
-                VALUES (?, ?, ?)
-                """,
-                (user_id, certificate_type, certificate_code)
-            )
-            conn.commit()
-            
-            # Log certificate creation event
-            self.log_event(
-                user_id, 
-                "certificate_created", 
-                f"Certificate of type '{certificate_type}' created with code {certificate_code}"
-            )
+            with self.transaction() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO certificates 
+                    (user_id, certificate_type, certificate_code) 
+                    VALUES (?, ?, ?)
+                    """,
+                    (user_id, certificate_type, certificate_code)
+                )
+                
+                # Log certificate creation event
+                self.log_event(
+                    user_id, 
+                    "certificate_created", 
+                    f"Certificate of type '{certificate_type}' created with code {certificate_code}"
+                )
             
             return certificate_code
         except Exception as e:
             print(f"Error creating certificate: {str(e)}")
             return None
-        finally:
-            self.disconnect()
             
     def complete_certificate(self, certificate_code):
         """Mark a certificate as completed"""
-        conn, cursor = self.connect()
         try:
-            cursor.execute(
-                """
-                UPDATE certificates 
-                SET completed_date = CURRENT_TIMESTAMP
-                WHERE certificate_code = ?
-                """,
-                (certificate_code,)
-            )
-            conn.commit()
-            
-            # Get user id for the certificate
-            cursor.execute(
-                "SELECT user_id, certificate_type FROM certificates WHERE certificate_code = ?",
-                (certificate_code,)
-            )
-            result = cursor.fetchone()
-            if result:
-                user_id, cert_type = result
-                # Log certificate completion event
-                self.log_event(
-                    user_id, 
-                    "certificate_completed", 
-                    f"Certificate of type '{cert_type}' with code {certificate_code} completed"
+            with self.transaction() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE certificates 
+                    SET completed_date = CURRENT_TIMESTAMP
+                    WHERE certificate_code = ?
+                    """,
+                    (certificate_code,)
+                )
+                
+                # Get user id for the certificate
+                cursor.execute(
+                    "SELECT user_id, certificate_type FROM certificates WHERE certificate_code = ?",
+                    (certificate_code,)
                 )
+                result = cursor.fetchone()
+                if result:
+                    user_id, cert_type = result
+                    # Log certificate completion event
+                    self.log_event(
+                        user_id, 
+                        "certificate_completed", 
+                        f"Certificate of type '{cert_type}' with code {certificate_code} completed"
+                    )
             
             return True
         except Exception as e:
             print(f"Error completing certificate: {str(e)}")
             return False
+            
+    def get_users_with_progress(self, school=None, class_name=None, section=None):
+        """
+        Get users (optionally one school, class or section) with their progress counts
+        
+        Returns:
+            list: Dictionaries with id, username, profile_data, points,
+                tutorial_count and challenge_count
+        """
+        conditions = []
+        params = []
+        for column, value in (("school", school), ("class", class_name), ("section", section)):
+            if value:
+                conditions.append(f'u."{column}" = ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(
+                f"""
+                SELECT u.id, u.username, u.full_name, u.parent_name, u.dob,
+                       u.class, u.section, u.school, COALESCE(p.points, 0),
+                       COALESCE(p.tutorial_count, 0), COALESCE(p.challenge_count, 0)
+                FROM users u
+                LEFT JOIN user_progress p ON p.user_id = u.id
+                {where}
+                ORDER BY u.id
+                """,
+                params
+            )
+            users = []
+            for row in cursor.fetchall():
+                users.append({
+                    "id": row[0],
+                    "username": row[1],
+                    "profile_data": {
+                        'full_name': row[2] or '',
+                        'parent_name': row[3] or '',
+                        'dob': row[4] or '',
+                        'class': row[5] or '',
+                        'section': row[6] or '',
+                        'school': row[7] or ''
+                    },
+                    "points": row[8],
+                    "tutorial_count": row[9],
+                    "challenge_count": row[10]
+                })
+            return users
         finally:
             self.disconnect()
             
-    def get_user_certificates(self, user_id):
-        """Get all certificates for a user"""
+    # Leaderboards
+    def get_leaderboard(self, scope, profile, limit=10):
+        """
+        Get the top students of a school, class or section
+        
+        Args:
+            scope (str): "school", "class" or "section"
+            profile (dict): school, class and section picking the leaderboard
+            limit (int): Number of students to return
+            
+        Returns:
+            list: Dictionaries with rank, user_id, username, full_name and
+                points, best first (students with equal points share a rank);
+                empty if the profile does not say which leaderboard to use
+        """
+        key = leaderboard_keys(profile).get(scope)
+        if key is None:
+            return []
+        
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(GET_LEADERBOARD_TOP_SQL, (scope, key, limit))
+            leaders = []
+            for position, row in enumerate(cursor.fetchall(), start=1):
+                tied = leaders and leaders[-1]["points"] == row[3]
+                leaders.append({
+                    "rank": leaders[-1]["rank"] if tied else position,
+                    "user_id": row[0],
+                    "username": row[1],
+                    "full_name": row[2] or "",
+                    "points": row[3]
+                })
+            return leaders
+        finally:
+            self.disconnect()
+            
+    def get_leaderboard_rank(self, user_id, scope):
+        """
+        Get a student's place on their school, class or section leaderboard
+        
+        Returns:
+            dict: rank (1 is best; equal points share a rank), points and
+                students (how many are on the leaderboard), or None if the
+                student is not on a leaderboard of this scope
+        """
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(GET_LEADERBOARD_MEMBER_SQL, (user_id, scope))
+            member = cursor.fetchone()
+            if member is None:
+                return None
+            key, points = member
+            cursor.execute(GET_LEADERBOARD_RANK_SQL, (points, scope, key))
+            ahead, students = cursor.fetchone()
+            return {"rank": ahead + 1, "points": points, "students": students}
+        finally:
+            self.disconnect()
+            
+    def get_certificate_holders(self, certificate_type):
+        """Get the ids of users who already hold a completed certificate of a type"""
         conn, cursor = self.connect()
         try:
             cursor.execute(
                 """
-                SELECT certificate_type, issue_date, certificate_code, completed_date
-                FROM certificates
-                WHERE user_id = ?
-                ORDER BY issue_date DESC
+                SELECT DISTINCT user_id FROM certificates
+                WHERE certificate_type = ? AND completed_date IS NOT NULL
                 """,
-                (user_id,)
+                (certificate_type,)
             )
+            return {row[0] for row in cursor.fetchall()}
+        finally:
+            self.disconnect()
+            
+    def issue_certificates(self, user_ids, certificate_type):
+        """
+        Create and complete a certificate for many users in one transaction
+        
+        Args:
+            user_ids (list): Users who earned the certificate
+            certificate_type (str): The type of certificate
+            
+        Returns:
+            list: (user_id, certificate_code, completed_date) for each new certificate
+        """
+        import uuid
+        completed_date = _sqlite_timestamp()
+        issued = [(user_id, str(uuid.uuid4()), completed_date) for user_id in user_ids]
+        
+        with self.transaction() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO certificates 
+                (user_id, certificate_type, certificate_code, issue_date, completed_date) 
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [(user_id, certificate_type, code, date, date) for user_id, code, date in issued]
+            )
+            cursor.executemany(
+                "INSERT INTO user_events (user_id, event_type, event_details, timestamp) VALUES (?, ?, ?, ?)",
+                [
+                    (user_id, "certificate_earned", f"Earned {certificate_type} Certificate (batch issue, code {code})", date)
+                    for user_id, code, date in issued
+                ]
+            )
+        return issued
+        
+    def get_user_certificates(self, user_id):
+        """Get all certificates for a user"""
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(GET_USER_CERTIFICATES_SQL, (user_id,))
             certificates = cursor.fetchall()
             return [
                 {
@@ -376,20 +1647,57 @@ class DatabaseManager:
         finally:
             self.disconnect()
             
+    def get_certificate_eligibility(self, user_id):
+        """
+        Get the stored certificate eligibility of a user
+        
+        Returns:
+            dict: {"signature", "tutorial_count", "challenge_count", "eligible"},
+                or None if nothing is stored yet
+        """
+        conn, cursor = self.connect()
+        try:
+            cursor.execute(GET_CERTIFICATE_ELIGIBILITY_SQL, (user_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return {
+                "signature": row[0],
+                "tutorial_count": row[1],
+                "challenge_count": row[2],
+                "eligible": json.loads(row[3])
+            }
+        finally:
+            self.disconnect()
+            
+    def save_certificate_eligibility(self, user_id, eligibility):
+        """Store a user's certificate eligibility (as made by certificate_rules.evaluate_eligibility)"""
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(
+                    """
+                    INSERT OR REPLACE INTO certificate_eligibility
+                    (user_id, rules_signature, tutorial_count, challenge_count, eligible)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        user_id,
+                        eligibility["signature"],
+                        eligibility["tutorial_count"],
+                        eligibility["challenge_count"],
+                        json.dumps(eligibility["eligible"])
+                    )
+                )
+            return True
+        except Exception as e:
+            print(f"Error saving certificate eligibility: {str(e)}")
+            return False
+            
     def verify_certificate(self, certificate_code):
         """Verify a certificate by its code"""
         conn, cursor = self.connect()
         try:
-            cursor.execute(
-                """
-                SELECT c.certificate_type, c.issue_date, c.completed_date, u.username,
-                       u.full_name, u.parent_name, u.dob, u.class, u.section, u.school, u.id
-                FROM certificates c
-                JOIN users u ON c.user_id = u.id
-                WHERE c.certificate_code = ?
-                """,
-                (certificate_code,)
-            )
+            cursor.execute(VERIFY_CERTIFICATE_SQL, (certificate_code,))
             result = cursor.fetchone()
             if result:
                 # Create a profile data dictionary from the user information
@@ -452,14 +1760,39 @@ class DatabaseManager:
                 return False
         return False
 
-# Create a singleton instance
-db_manager = DatabaseManager()
+# Singleton instance that keeps its connections open, created on first use
+# so importing this module never opens the database
+_db_manager = None
+_db_manager_lock = threading.Lock()
+
+def get_db_manager():
+    """Return the shared database manager, opening the database on first use"""
+    global _db_manager
+    with _db_manager_lock:
+        if _db_manager is None:
+            manager = DatabaseManager(persistent=True, normalized_progress=True)
+            atexit.register(manager.close_all)
+            
+            # Keep audit-log and submission writes off the request path (registered
+            # after close_all, so at exit the queues are flushed before connections are closed)
+            manager.start_event_writer()
+            manager.start_submission_writer()
+            _db_manager = manager
+        return _db_manager
+
+def __getattr__(name):
+    # `from database_manager import db_manager` keeps working, and is the
+    # point where the database gets opened
+    if name == "db_manager":
+        return get_db_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Migration function to be called during app startup if needed
 def migrate_from_json_if_needed():
     """Check if migration is needed and perform it"""
     # Check if users.json exists and users table is empty
     if os.path.exists("users.json"):
+        db_manager = get_db_manager()
         conn, cursor = db_manager.connect()
         cursor.execute("SELECT COUNT(*) FROM users")
         user_count = cursor.fetchone()[0]
@@ -469,4 +1802,13 @@ def migrate_from_json_if_needed():
             # Perform migration
             return db_manager.migrate_data_from_json()
     
-    return False
\ No newline at end of file
+    return False
+
+if __name__ == "__main__":
+    # Report hot queries that would scan a whole table
+    scans = {name: steps for name, steps in get_db_manager().check_query_plans().items() if steps}
+    if scans:
+        for name, steps in scans.items():
+            print(f"{name}: {'; '.join(steps)}")
+    else:
+        print("All hot queries use indexes.")
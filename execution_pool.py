@@ -0,0 +1,398 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # resource is only available on POSIX systems
+    resource = None
+
+# Default limits for a single run of student code
+DEFAULT_POOL_SIZE = max(2, os.cpu_count() or 2)
+DEFAULT_WALL_TIMEOUT = 5.0  # seconds of real time a run may take
+DEFAULT_CPU_SECONDS = 3  # seconds of CPU time a run may use
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024  # extra memory a worker may allocate
+DEFAULT_MAX_RUNS_PER_WORKER = 200  # recycle workers after this many runs
+DEFAULT_CHECKOUT_TIMEOUT = 10.0  # seconds to wait for a free worker
+DEFAULT_MAX_PROCESSES = 0  # processes (and threads) student code may start
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024  # largest file student code may write
+DEFAULT_MAX_OPEN_FILES = 32  # file descriptors a worker may have open
+
+# Kid-friendly messages for runs that never produced a result
+TIMEOUT_ERROR = "Your code took too long to finish! Check for a loop that never stops. (TimeoutError)"
+CRASH_ERROR = "Your code used too much of the computer's power or memory, so we had to stop it. (ResourceError)"
+BUSY_ERROR = "Lots of coders are running code right now! Wait a moment and press Run again. (BusyError)"
+POOL_ERRORS = (TIMEOUT_ERROR, CRASH_ERROR, BUSY_ERROR)
+
+
+def _current_address_space():
+    """Return the worker's current virtual memory size in bytes, or 0 if unknown"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[0])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _apply_memory_limit(memory_bytes):
+    """Cap how much more memory this worker process may allocate"""
+    if resource is None or not memory_bytes:
+        return
+    limit = _current_address_space() + memory_bytes
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        pass
+
+
+def _apply_cpu_limit(cpu_seconds):
+    """Allow the next run to use at most cpu_seconds more CPU time"""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _apply_process_limits():
+    """
+    Stop student code from starting processes, writing big files or
+    opening many files
+
+    RLIMIT_NPROC is not enforced for root, so the app should run as an
+    ordinary user; leftover processes are also killed after every run.
+    """
+    if resource is None:
+        return
+    # Writing past the file size limit should raise an error, not kill the worker
+    if hasattr(signal, "SIGXFSZ"):
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    for name, value in (
+        ("RLIMIT_NPROC", DEFAULT_MAX_PROCESSES),
+        ("RLIMIT_FSIZE", DEFAULT_MAX_FILE_BYTES),
+        ("RLIMIT_NOFILE", DEFAULT_MAX_OPEN_FILES),
+    ):
+        limit = getattr(resource, name, None)
+        if limit is None:
+            continue
+        _, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        try:
+            resource.setrlimit(limit, (value, value))
+        except (ValueError, OSError):
+            pass
+
+
+def _kill_leftover_processes():
+    """Kill any process student code started in this worker's process group"""
+    me = os.getpid()
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return
+    for pid in pids:
+        if pid == me:
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # pid (name) state ppid pgrp ... - the name may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[2]) == me:
+                os.kill(pid, signal.SIGKILL)
+        except (OSError, ValueError, IndexError):
+            pass
+
+
+def _empty_directory(path):
+    """Delete everything student code left in its working directory"""
+    for name in os.listdir(path):
+        target = os.path.join(path, name)
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target, ignore_errors=True)
+        else:
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+
+
+def _worker_main(conn, cpu_seconds, memory_bytes):
+    """
+    Loop run by every worker process: receive code, run it, send back the result
+
+    The worker leads its own process group, so the pool can kill it
+    together with anything student code started, and runs code in an
+    empty temporary directory instead of the app's directory.
+
+    Args:
+        conn (Connection): Pipe end shared with the parent process
+        cpu_seconds (int): CPU time allowed for each run
+        memory_bytes (int): Extra memory the worker may allocate
+    """
+    if hasattr(os, "setsid"):
+        os.setsid()
+
+    from code_executor import execute_python_code
+
+    workdir = tempfile.mkdtemp(prefix="kids-python-run-")
+    os.chdir(workdir)
+    _apply_memory_limit(memory_bytes)
+    _apply_process_limits()
+
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            # None is the signal to shut down
+            if request is None:
+                break
+
+            code, stream = request
+            on_output = (lambda text: conn.send(("output", text))) if stream else None
+
+            _apply_cpu_limit(cpu_seconds)
+            try:
+                result = execute_python_code(code, sandboxed=False, on_output=on_output)
+            finally:
+                _kill_leftover_processes()
+                _empty_directory(workdir)
+            try:
+                conn.send(("result", result))
+            except (EOFError, OSError):
+                break
+    finally:
+        _kill_leftover_processes()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class _Worker:
+    """A single warm worker process and the pipe used to talk to it"""
+
+    def __init__(self, context, cpu_seconds, memory_bytes):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, cpu_seconds, memory_bytes),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+
+    def run(self, code, timeout, on_output=None):
+        """
+        Send code to the worker and wait for its (output, error) result
+
+        Raises:
+            TimeoutError: If no result arrives within timeout seconds
+            EOFError: If the worker died while running the code
+        """
+        self.conn.send((code, on_output is not None))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.conn.poll(remaining):
+                raise TimeoutError
+            kind, payload = self.conn.recv()
+            if kind == "output":
+                on_output(payload)
+                continue
+            return payload
+
+    def ran_out_of_cpu(self):
+        """Check whether the worker was killed for going over its CPU time limit"""
+        sigxcpu = getattr(signal, "SIGXCPU", None)
+        return sigxcpu is not None and self.process.exitcode == -sigxcpu
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it does not"""
+        try:
+            self.conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+    def kill(self):
+        """Terminate the worker, and every process it started, immediately"""
+        if self.conn.closed:
+            return
+        # Called before the worker is reaped, so its id cannot have been
+        # reused for another process group
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ExecutionPool:
+    """
+    A pool of pre-started worker processes that run student code
+
+    Each run gets its own CPU time, wall-clock and memory limits. A worker
+    that times out or crashes is thrown away and replaced with a fresh one,
+    so one runaway program never blocks anybody else.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, wall_timeout=DEFAULT_WALL_TIMEOUT,
+                 cpu_seconds=DEFAULT_CPU_SECONDS, memory_bytes=DEFAULT_MEMORY_BYTES,
+                 max_runs_per_worker=DEFAULT_MAX_RUNS_PER_WORKER,
+                 checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT, start_method=None):
+        """
+        Configure the pool (workers are started on first use)
+
+        Args:
+            size (int): Number of worker processes
+            wall_timeout (float): Real time in seconds a run may take
+            cpu_seconds (int): CPU time in seconds a run may use
+            memory_bytes (int): Extra memory a worker may allocate
+            max_runs_per_worker (int): Runs before a worker is recycled
+            checkout_timeout (float): Seconds to wait for a free worker
+            start_method (str, optional): multiprocessing start method
+                (default: "forkserver" where available, so workers do not
+                inherit a copy of the app's memory)
+        """
+        self.size = size
+        self.wall_timeout = wall_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.max_runs_per_worker = max_runs_per_worker
+        self.checkout_timeout = checkout_timeout
+        if start_method is None and "forkserver" in multiprocessing.get_all_start_methods():
+            start_method = "forkserver"
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers are forked from a small server that already imported
+            # the executor, so replacing a worker stays quick
+            self._context.set_forkserver_preload(["execution_pool", "code_executor"])
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _spawn(self):
+        """Start a new worker and keep track of it"""
+        worker = _Worker(self._context, self.cpu_seconds, self.memory_bytes)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker, kill=False):
+        """Stop a worker and forget about it"""
+        with self._lock:
+            self._workers.discard(worker)
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+
+    def start(self):
+        """Start all worker processes if they are not running yet"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def run(self, code, on_output=None):
+        """
+        Run code on a free worker
+
+        Args:
+            code (str): Python code to execute
+            on_output (function, optional): Called with chunks of output
+                while the code is still running
+
+        Returns:
+            tuple: (output, error)
+        """
+        self.start()
+
+        try:
+            worker = self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            return "", BUSY_ERROR
+
+        try:
+            output, error = worker.run(code, self.wall_timeout, on_output)
+        except TimeoutError:
+            output, error = "", TIMEOUT_ERROR
+            self._retire(worker, kill=True)
+            worker = None
+        except (EOFError, OSError):
+            worker.kill()
+            output, error = "", TIMEOUT_ERROR if worker.ran_out_of_cpu() else CRASH_ERROR
+            self._retire(worker, kill=True)
+            worker = None
+        except BaseException:
+            # The caller gave up mid-run (e.g. on_output raised), so the
+            # worker may still be busy; replace it before passing this on
+            self._retire(worker, kill=True)
+            self._idle.put(self._spawn())
+            raise
+        else:
+            worker.runs += 1
+            if worker.runs >= self.max_runs_per_worker:
+                self._retire(worker)
+                worker = None
+
+        # Replace any worker we threw away so the pool never shrinks
+        self._idle.put(worker or self._spawn())
+        return output, error
+
+    def shutdown(self):
+        """Stop every worker process"""
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+            self._started = False
+        for worker in workers:
+            worker.stop()
+        while not self._idle.empty():
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+
+# Process-wide pool shared by every Streamlit session
+_execution_pool = None
+_execution_pool_lock = threading.Lock()
+
+
+def get_execution_pool():
+    """Return the shared execution pool, creating it on first use"""
+    global _execution_pool
+    with _execution_pool_lock:
+        if _execution_pool is None:
+            _execution_pool = ExecutionPool()
+            atexit.register(_execution_pool.shutdown)
+        return _execution_pool
@@ -0,0 +1,419 @@
+import ast
+import hashlib
+import secrets
+
+# Grading a challenge happens in two passes:
+#   1. Structure checks look at the code without running it (does it use a
+#      loop? define mix_potion? hard-code the answer?). Most wrong answers
+#      are turned away here, before any worker is needed.
+#   2. The student's code runs once, followed by a small harness that calls
+#      their functions with each test case and prints the results after a
+#      marker line. The output above the marker is shown to the student;
+#      the results below it are checked here.
+
+# Per-process secret, so student code cannot guess the marker and fake results
+_MARKER_KEY = secrets.token_bytes(16)
+
+TOO_MUCH_OUTPUT = "Your code printed so much that we couldn't check your answer. Try printing fewer lines!"
+
+
+# Structure checks: each returns a (check, message) pair, where check takes
+# the list of AST nodes of the submission and returns True when it passes
+
+def _called_name(node):
+    """Name of the function called by an ast.Call (foo(...) or x.foo(...))"""
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+def calls_function(name, min_args=0, message=None):
+    """The code calls name(...) with at least min_args arguments"""
+    def check(nodes):
+        return any(
+            isinstance(node, ast.Call) and _called_name(node) == name and
+            len(node.args) + len(node.keywords) >= min_args
+            for node in nodes
+        )
+    return check, message or f"Use `{name}()` in your code."
+
+def defines_function(name, arg_count=None, message=None):
+    """The code defines a function called name (taking arg_count parameters)"""
+    def check(nodes):
+        return any(
+            isinstance(node, ast.FunctionDef) and node.name == name and
+            (arg_count is None or len(node.args.args) == arg_count)
+            for node in nodes
+        )
+    if message is None:
+        message = f"Create a function called `{name}`"
+        if arg_count is not None:
+            message += f" that takes {arg_count} parameters"
+        message += "."
+    return check, message
+
+def returns_value(function_name, message=None):
+    """The function called function_name has a return statement with a value"""
+    def check(nodes):
+        for node in nodes:
+            if isinstance(node, ast.FunctionDef) and node.name == function_name:
+                if any(isinstance(inner, ast.Return) and inner.value is not None for inner in ast.walk(node)):
+                    return True
+        return False
+    return check, message or f"Make `{function_name}` give back its answer with `return`."
+
+def uses_node(*node_types, message=None):
+    """The code contains one of the given kinds of AST node (e.g. ast.JoinedStr)"""
+    def check(nodes):
+        return any(isinstance(node, node_types) for node in nodes)
+    return check, message or "Your code is missing something the challenge asks for."
+
+def uses_loop(message=None):
+    """The code has a for loop, while loop or comprehension"""
+    return uses_node(
+        ast.For, ast.While, ast.ListComp, ast.DictComp, ast.GeneratorExp,
+        message=message or "Use a loop (`for` or `while`) to repeat things."
+    )
+
+def uses_if(message=None):
+    """The code makes a decision with if/else"""
+    return uses_node(ast.If, ast.IfExp, message=message or "Use an `if` statement to make a decision.")
+
+def uses_variable(name, message=None):
+    """The code reads the variable called name"""
+    def check(nodes):
+        return any(
+            isinstance(node, ast.Name) and node.id == name and isinstance(node.ctx, ast.Load)
+            for node in nodes
+        )
+    return check, message or f"Use the `{name}` variable in your code."
+
+def uses_operator(operator, message=None):
+    """The code uses an arithmetic operator (e.g. ast.Mult for *)"""
+    def check(nodes):
+        return any(
+            isinstance(node, (ast.BinOp, ast.AugAssign)) and isinstance(node.op, operator)
+            for node in nodes
+        )
+    return check, message or "Use Python to do the calculation."
+
+def uses_any(*checks, message=None):
+    """At least one of several structure checks passes"""
+    def check(nodes):
+        return any(inner(nodes) for inner, _ in checks)
+    return check, message or checks[0][1]
+
+def avoids_constant(value, message=None):
+    """The answer is not typed in directly (as a number, or inside a string)"""
+    text = str(value).lower()
+    def check(nodes):
+        for node in nodes:
+            if isinstance(node, ast.Constant):
+                if isinstance(node.value, str) and text in node.value.lower():
+                    return False
+                if not isinstance(node.value, (str, bool)) and node.value == value:
+                    return False
+        return True
+    return check, message or "Let Python work out the answer instead of typing it in yourself!"
+
+
+# Output checks: (check, message) pairs, where check takes the printed output
+
+def output_matches(predicate, message):
+    """The printed output passes predicate(output)"""
+    return predicate, message
+
+
+# Test cases
+
+def function_test(function_name, args, expect, message=None):
+    """
+    Call one of the student's functions and check what it returns
+
+    Args:
+        function_name (str): Function defined by the student
+        args (tuple): Arguments to call it with (must be Python literals)
+        expect: The value it should return, or a function taking the
+            returned value and giving True when it is right
+        message (str, optional): Feedback when the test fails
+    """
+    call = f"{function_name}({', '.join(repr(arg) for arg in args)})"
+    return {
+        "function": function_name,
+        "args": tuple(args),
+        "expect": expect,
+        "message": message or f"`{call}` didn't give the right answer."
+    }
+
+
+# Grading specs written as data (e.g. in content packs) are compiled into
+# the checks above once, when the pack is loaded
+
+def text_matcher(spec):
+    """
+    Build a predicate over text from a declarative spec
+
+    Args:
+        spec (dict): Any of "contains" (all of these), "contains_any" (at
+            least one), "ignore_case", "min_words", "not_blank" and "any_of"
+            (a list of specs, at least one must match); all given parts
+            must hold
+
+    Returns:
+        function: Takes a value and returns True when it is matching text
+    """
+    ignore_case = spec.get("ignore_case", False)
+    fold = (lambda text: text.lower()) if ignore_case else (lambda text: text)
+    contains = [fold(part) for part in spec.get("contains", [])]
+    contains_any = [fold(part) for part in spec.get("contains_any", [])]
+    min_words = spec.get("min_words", 0)
+    not_blank = spec.get("not_blank", False)
+    alternatives = [text_matcher(inner) for inner in spec.get("any_of", [])]
+
+    def match(value):
+        if not isinstance(value, str):
+            return False
+        text = fold(value)
+        return (
+            all(part in text for part in contains) and
+            (not contains_any or any(part in text for part in contains_any)) and
+            len(value.split()) >= min_words and
+            (not not_blank or value.strip() != "") and
+            (not alternatives or any(alternative(value) for alternative in alternatives))
+        )
+    return match
+
+def _compile_structure_check(spec):
+    """Turn {"check": name, ...arguments} into a (check, message) pair"""
+    spec = dict(spec)
+    name = spec.pop("check")
+    if name == "uses_any":
+        checks = [_compile_structure_check(inner) for inner in spec.pop("checks")]
+        return uses_any(*checks, **spec)
+    if name == "uses_operator":
+        return uses_operator(getattr(ast, spec.pop("operator")), **spec)
+    if name == "uses_node":
+        return uses_node(*(getattr(ast, node) for node in spec.pop("nodes")), **spec)
+    if name not in STRUCTURE_CHECKS:
+        raise ValueError(f"Unknown structure check: {name}")
+    return STRUCTURE_CHECKS[name](**spec)
+
+def _compile_test(spec):
+    """Turn a test spec into a function_test(); "expect_text" is a text_matcher spec"""
+    if "expect_text" in spec:
+        expect = text_matcher(spec["expect_text"])
+    else:
+        expect = spec["expect"]
+    return function_test(spec["function"], tuple(spec.get("args", ())), expect, spec.get("message"))
+
+def compile_grading(spec):
+    """
+    Compile a grading spec written as data into the form grade_submission() uses
+
+    Args:
+        spec (dict): {"structure": [{"check": "uses_loop", ...}],
+            "tests": [{"function", "args", "expect" or "expect_text", "message"}],
+            "output": [{"message", ...text_matcher spec}]}
+
+    Returns:
+        dict: Grading spec with compiled checks
+
+    Raises:
+        ValueError: If the spec names an unknown check
+    """
+    return {
+        "structure": [_compile_structure_check(check) for check in spec.get("structure", [])],
+        "tests": [_compile_test(test) for test in spec.get("tests", [])],
+        "output": [
+            output_matches(text_matcher(check), check["message"])
+            for check in spec.get("output", [])
+        ]
+    }
+
+# Structure checks that can be named in a grading spec
+STRUCTURE_CHECKS = {
+    "calls_function": calls_function,
+    "defines_function": defines_function,
+    "returns_value": returns_value,
+    "uses_node": uses_node,
+    "uses_loop": uses_loop,
+    "uses_if": uses_if,
+    "uses_variable": uses_variable,
+    "uses_operator": uses_operator,
+    "uses_any": uses_any,
+    "avoids_constant": avoids_constant,
+}
+
+
+def check_structure(code, grading):
+    """
+    Run the structure checks of a challenge without executing anything
+
+    Args:
+        code (str): The student's code
+        grading (dict): The challenge's grading spec
+
+    Returns:
+        list: Feedback messages for failed checks (empty when all pass),
+            or None if the code is not valid Python
+    """
+    try:
+        nodes = list(ast.walk(ast.parse(code)))
+    except (SyntaxError, ValueError):
+        return None
+    return [message for check, message in grading.get("structure", []) if not check(nodes)]
+
+
+def _marker(program):
+    """Marker printed before the test results of a program"""
+    digest = hashlib.blake2b(program.encode("utf-8"), key=_MARKER_KEY, digest_size=12).hexdigest()
+    return f"\x00grading-{digest}\x00"
+
+
+def build_program(code, tests):
+    """
+    Add a test harness to the student's code
+
+    The harness silences print while the tests run (so only the student's
+    own run is shown) and prints every result on one line after a marker.
+    Names start with _grade_ to stay out of the student's way.
+
+    Returns:
+        tuple: (program, marker)
+    """
+    marker = _marker(code + repr([(test["function"], test["args"]) for test in tests]))
+    lines = [
+        code,
+        "",
+        "_grade_print = print",
+        "print = lambda *args, **kwargs: None",
+        "_grade_results = []",
+    ]
+    for test in tests:
+        call = f"{test['function']}(*{test['args']!r})"
+        lines += [
+            "try:",
+            f"    _grade_results.append(('ok', repr({call})))",
+            "except Exception as _grade_error:",
+            "    _grade_results.append(('error', repr(_grade_error)))",
+        ]
+    lines.append(f"_grade_print({marker!r} + repr(_grade_results), end='')")
+    return "\n".join(lines), marker
+
+
+class _MarkerFilter:
+    """Passes streamed output on, holding back the marker and the results after it"""
+
+    def __init__(self, on_output, marker):
+        self.on_output = on_output
+        self.marker = marker
+        self.pending = ""
+        self.done = False
+
+    def __call__(self, text):
+        if self.done:
+            return
+        self.pending += text
+        index = self.pending.find(self.marker)
+        if index >= 0:
+            self.done = True
+            if index:
+                self.on_output(self.pending[:index])
+            return
+        # Hold back anything that could be the start of the marker
+        keep = len(self.marker) - 1
+        if len(self.pending) > keep:
+            self.on_output(self.pending[:-keep])
+            self.pending = self.pending[-keep:]
+
+    def finish(self):
+        """Send whatever was held back if the marker never came"""
+        if not self.done and self.pending:
+            self.on_output(self.pending)
+        self.pending = ""
+
+
+def _literal(text):
+    """Turn a repr() back into a value when it is a Python literal"""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return text
+
+
+def _passes(expect, value):
+    if callable(expect):
+        try:
+            return bool(expect(value))
+        except Exception:
+            return False
+    return value == expect
+
+
+def grade_submission(code, grading, execute=None, on_output=None, memoize=True):
+    """
+    Grade a challenge submission with one run of the student's code
+
+    Args:
+        code (str): The student's code
+        grading (dict): Grading spec with optional "structure", "tests"
+            and "output" lists
+        execute (function, optional): Runs code and returns (output, error)
+            (defaults to code_executor.execute_python_code)
+        on_output (function, optional): Called with chunks of the student's
+            output while the code is still running
+        memoize (bool): Passed on to execute
+
+    Returns:
+        dict: {"passed", "feedback", "output", "error", "ran"} where
+            feedback lists what still needs fixing and ran says whether
+            the code was executed at all
+    """
+    if execute is None:
+        from code_executor import execute_python_code as execute
+
+    result = {"passed": False, "feedback": [], "output": "", "error": None, "ran": False}
+
+    feedback = check_structure(code, grading)
+    if feedback is None:
+        # Not valid Python; let the executor explain (it never starts a worker for this)
+        result["output"], result["error"] = execute(code)
+        return result
+    if feedback:
+        result["feedback"] = feedback
+        return result
+
+    tests = grading.get("tests", [])
+    program, marker = build_program(code, tests)
+    stream = _MarkerFilter(on_output, marker) if on_output is not None else None
+    output, error = execute(program, on_output=stream, memoize=memoize)
+    if stream is not None:
+        stream.finish()
+
+    result["ran"] = True
+    index = output.rfind(marker)
+    if index >= 0:
+        output, results = output[:index], _literal(output[index + len(marker):])
+    else:
+        results = None
+    result["output"] = output
+    result["error"] = error
+    if error:
+        return result
+
+    if results is None or len(results) != len(tests):
+        result["feedback"] = [TOO_MUCH_OUTPUT]
+        return result
+
+    for test, (status, value) in zip(tests, results):
+        if status != "ok" or not _passes(test["expect"], _literal(value)):
+            feedback.append(test["message"])
+
+    for check, message in grading.get("output", []):
+        if not _passes(check, output):
+            feedback.append(message)
+
+    result["feedback"] = feedback
+    result["passed"] = not feedback
+    return result
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules that must load without the UI stack, and how long (in
+# milliseconds, on top of interpreter start-up) each may take to import.
+# Execution workers, the command-line tools and tests only need these.
+HEADLESS_BUDGETS_MS = {
+    "code_executor": 40,
+    "execution_pool": 40,
+    "grading": 40,
+    "database_manager": 40,
+    "progress_writer": 20,
+    "certificate_rules": 20,
+    "certificate_layout": 20,
+    "certificate_cache": 20,
+    "certificate_verification": 20,
+    "certificate_pdf": 30,
+    "certificate_render": 40,
+    "content_packs": 30,
+    "tutorials": 40,
+    "challenges": 60,
+    "autograder": 60,
+    "certificate_batch": 100,
+}
+
+# Packages none of the modules above may import at import time
+HEAVY_PACKAGES = ("streamlit", "pandas", "numpy", "PIL", "reportlab")
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+__import__({module!r})
+elapsed = time.perf_counter() - started
+db = sys.modules.get("database_manager")
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "heavy": sorted(name for name in {heavy!r} if name in sys.modules),
+    "db_opened": bool(db is not None and getattr(db, "_db_manager", None) is not None),
+}}))
+"""
+
+
+def measure_import(module, repeat=5, root=None):
+    """
+    Import a module in fresh interpreters and report the fastest time
+
+    Args:
+        module (str): Module to import
+        repeat (int): Number of fresh interpreters to try (the minimum is kept)
+        root (str, optional): Directory holding the app's modules
+
+    Returns:
+        dict: {"ms", "heavy", "db_opened"} where heavy lists UI packages
+            that got imported and db_opened says whether the database was opened
+    """
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    probe = _PROBE.format(root=root, module=module, heavy=HEAVY_PACKAGES)
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or result["ms"] < best["ms"]:
+            best = result
+    return best
+
+
+def check_budgets(budgets=None, repeat=5, scale=1.0):
+    """
+    Measure every headless module against its budget
+
+    Args:
+        budgets (dict, optional): Module -> budget in milliseconds
+            (defaults to HEADLESS_BUDGETS_MS)
+        repeat (int): Fresh interpreters per module
+        scale (float): Multiply every budget, e.g. for slow CI machines
+
+    Returns:
+        list: (module, result, budget_ms, problems) tuples; problems is an
+            empty list when the module is within its budget
+    """
+    report = []
+    for module, budget in (budgets or HEADLESS_BUDGETS_MS).items():
+        result = measure_import(module, repeat=repeat)
+        budget *= scale
+        problems = []
+        if result["ms"] > budget:
+            problems.append(f"took {result['ms']:.1f}ms (budget {budget:.0f}ms)")
+        if result["heavy"]:
+            problems.append(f"imported {', '.join(result['heavy'])}")
+        if result["db_opened"]:
+            problems.append("opened the database")
+        report.append((module, result, budget, problems))
+    return report
+
+
+def main(argv=None):
+    """Command-line entry point: print import times and fail if a budget is broken"""
+    parser = argparse.ArgumentParser(description="Check that headless modules import quickly")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module, result, budget, problems in check_budgets(repeat=args.repeat, scale=args.scale):
+        status = "FAIL " + "; ".join(problems) if problems else "ok"
+        print(f"{module:<26} {result['ms']:7.1f}ms / {budget:4.0f}ms  {status}")
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,14 @@
 import streamlit as st
-import pandas as pd
+import weakref
 from datetime import datetime
 from database_manager import db_manager
+from progress_writer import get_progress_writer
 
 def load_progress(username):
     """Load user progress from storage"""
-    if "user_id" in st.session_state:
+    if st.session_state.get("user_id"):
         user_id = st.session_state.user_id
+        flush_progress(user_id)
         return db_manager.get_user_progress(user_id)
     else:
         # Return default progress for non-logged-in users
@@ -18,29 +20,110 @@ def load_progress(username):
             "last_login": str(datetime.now())
         }
 
-def save_progress(username, points, completed_tutorials, completed_challenges, emoji_collection):
-    """Save user progress to storage"""
-    if "user_id" in st.session_state:
-        user_id = st.session_state.user_id
-        success = db_manager.update_user_progress(
-            user_id, 
-            points, 
-            completed_tutorials, 
-            completed_challenges, 
-            emoji_collection
-        )
+class _FlushOnSessionEnd:
+    """
+    Kept in session state: when Streamlit discards the session (the tab
+    was closed), the student's pending progress is written right away
+    """
+    def __init__(self, user_id):
+        self.user_id = user_id
+        weakref.finalize(self, get_progress_writer().request_flush, user_id)
+
+def record_completion(item_type, item_id, points, emoji=None):
+    """
+    Save a completed tutorial or challenge, with its points and reward emoji
+    
+    Only what was earned is sent to the database, in the background once
+    the student pauses, so clicking quickly through tutorials costs one
+    write, and a second tab cannot overwrite progress made in this one.
+    
+    Args:
+        item_type (str): "tutorial" or "challenge"
+        item_id (int): Index of the tutorial or challenge
+        points (int): Points the completion is worth
+        emoji (str, optional): Reward emoji the student got
         
-        if success:
-            # Log progress update event
-            db_manager.log_event(
-                user_id, 
-                "progress_updated", 
-                f"Progress updated: {points} points, {len(completed_tutorials)} tutorials, {len(completed_challenges)} challenges"
-            )
+    Returns:
+        bool: True if the completion was queued for saving
+    """
+    if st.session_state.get("user_id"):
+        user_id = st.session_state.user_id
+        get_progress_writer().complete(user_id, item_type, item_id, points=points, emoji=emoji)
         
-        return success
+        watcher = st.session_state.get("_progress_flush")
+        if watcher is None or watcher.user_id != user_id:
+            st.session_state._progress_flush = _FlushOnSessionEnd(user_id)
+        return True
     return False
 
+def flush_progress(user_id):
+    """
+    Write a student's queued progress now (on logout, or before reading it back)
+    
+    Returns:
+        bool: False if the progress could not be written (it stays queued)
+    """
+    return get_progress_writer().flush(user_id)
+
+def record_run(item_type, item_id, code, output, error, duration, verdict):
+    """
+    Store a run of the student's code (queued, so the page does not wait for it)
+    
+    Args:
+        item_type (str): "tutorial" or "challenge"
+        item_id (int): Index of the tutorial or challenge
+        code (str): The code that was run
+        output (str): What it printed
+        error (str): The error message, or None
+        duration (float): Seconds the run took
+        verdict (str): "passed", "failed", "rejected", "error" or "ran"
+    """
+    if not st.session_state.get("user_id"):
+        return
+    from code_executor import source_hash, error_class
+    db_manager.record_submission(
+        st.session_state.user_id,
+        item_type,
+        item_id,
+        code,
+        output_hash=source_hash(output) if output else None,
+        error_class=error_class(error),
+        duration_ms=round(duration * 1000, 2),
+        verdict=verdict
+    )
+
+def restore_last_attempt(editor_key, item_type, item_id, starter_code):
+    """
+    Fill a code editor with the student's last attempt (or the starter code)
+    
+    Only done when the editor has no value yet, so it happens once each
+    time the student opens a tutorial or challenge.
+    
+    Args:
+        editor_key (str): Session state key of the st.text_area
+        item_type (str): "tutorial" or "challenge"
+        item_id (int): Index of the tutorial or challenge
+        starter_code (str): Code to show if there is no earlier attempt
+        
+    Returns:
+        bool: True if an earlier attempt was restored
+    """
+    if editor_key in st.session_state:
+        return st.session_state.get(f"{editor_key}_restored", False)
+    
+    last = None
+    if st.session_state.get("user_id"):
+        last = db_manager.get_last_submission(st.session_state.user_id, item_type, item_id)
+    restored = last is not None and last["code"] != starter_code
+    st.session_state[editor_key] = last["code"] if restored else starter_code
+    st.session_state[f"{editor_key}_restored"] = restored
+    return restored
+
+def reset_editor(editor_key, starter_code):
+    """Put the starter code back into a code editor"""
+    st.session_state[editor_key] = starter_code
+    st.session_state[f"{editor_key}_restored"] = False
+
 def display_progress(username, points, completed_tutorials, completed_challenges, total_tutorials, total_challenges):
     """Display the user's progress"""
     st.title(f"My Learning Progress 📈")
@@ -154,6 +237,40 @@ def display_progress(username, points, completed_tutorials, completed_challenges
         else:
             st.success("You've solved all challenges! 🎉")
 
+def display_leaderboards(user_id, profile, limit=10):
+    """
+    Show the top students of the student's class, section and school, and where the student stands
+    
+    Args:
+        user_id (int): The student's ID
+        profile (dict): The student's school, class and section
+        limit (int): Students shown on each leaderboard
+    """
+    st.markdown("### Leaderboards 🥇")
+    
+    # Points still waiting to be saved should count on the leaderboard
+    flush_progress(user_id)
+    
+    titles = {"class": "My Class", "section": "My Section", "school": "My School"}
+    places = {}
+    for scope in ("class", "section", "school"):
+        place = db_manager.get_leaderboard_rank(user_id, scope)
+        if place is not None:
+            places[scope] = place
+    if not places:
+        st.info("Add your school and class to your profile to see how you compare with your classmates!")
+        return
+    
+    for tab, (scope, place) in zip(st.tabs([titles[scope] for scope in places]), places.items()):
+        with tab:
+            st.markdown(f"You are **#{place['rank']}** of {place['students']} with {place['points']} points ⭐")
+            
+            medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+            for leader in db_manager.get_leaderboard(scope, profile, limit):
+                name = leader["full_name"] or leader["username"]
+                line = f"{medals.get(leader['rank'], '#' + str(leader['rank']))} {name} - {leader['points']} points"
+                st.markdown(f"**{line}** (you)" if leader["user_id"] == user_id else line)
+
 def go_to_tutorial(index):
     """Navigate to a specific tutorial"""
     st.session_state.current_page = "tutorials"
@@ -0,0 +1,273 @@
+import atexit
+import threading
+import time
+
+# Clicking through tutorials changes a student's progress every second or
+# two. Instead of writing each change (plus an audit event and an
+# eligibility check) on every click, a student's changes are collected in
+# memory and written together once they pause. Changes are deltas (points
+# earned, items completed, emojis found), so nothing is overwritten.
+
+DEFAULT_QUIET_PERIOD = 2.0  # seconds without changes before progress is written
+DEFAULT_MAX_DELAY = 10.0  # seconds a change may wait, even if the student keeps clicking
+
+
+def new_changes():
+    """Empty set of progress changes"""
+    return {"points": 0, "completions": {}, "emojis": []}
+
+def merge_changes(older, newer):
+    """Combine two sets of progress changes into one, in the order they happened"""
+    merged = {
+        "points": older["points"] + newer["points"],
+        "completions": dict(older["completions"]),
+        "emojis": list(older["emojis"])
+    }
+    for item, points in newer["completions"].items():
+        merged["completions"].setdefault(item, points)
+    merged["emojis"] += [emoji for emoji in newer["emojis"] if emoji not in merged["emojis"]]
+    return merged
+
+def save_progress_now(db, user_id, changes):
+    """
+    Apply a student's progress changes, its audit event and certificate eligibility in one commit
+
+    Args:
+        db (DatabaseManager): Database to write to
+        user_id (int): The student's ID
+        changes (dict): "points" (extra points), "completions"
+            ((item_type, item_id) -> points) and "emojis" (list)
+
+    Returns:
+        bool: True if the changes were saved
+    """
+    from certificate_rules import refresh_eligibility
+    from content_packs import course_totals
+
+    with db.transaction():
+        for (item_type, item_id), points in changes["completions"].items():
+            db.mark_item_completed(user_id, item_type, item_id, points=points)
+        for emoji in changes["emojis"]:
+            db.add_emoji(user_id, emoji)
+        if changes["points"]:
+            # An error here must roll the whole save back, so the writer retries it
+            db.award_points(user_id, changes["points"], raise_errors=True)
+        counters = db.get_progress_counters(user_id)
+
+        # Log progress update event
+        db.log_event(
+            user_id,
+            "progress_updated",
+            f"Progress updated: {counters['points']} points, {counters['tutorial_count']} tutorials, {counters['challenge_count']} challenges"
+        )
+
+        # Keep the certificate page's eligibility up to date
+        refresh_eligibility(
+            db,
+            user_id,
+            counters["tutorial_count"],
+            counters["challenge_count"],
+            *course_totals()
+        )
+    return True
+
+
+class ProgressWriter:
+    """
+    Collects progress changes per student and writes them from a background thread
+
+    complete() and award() add to a student's pending changes. They are
+    written once the student has made no change for quiet_period seconds,
+    or at the latest max_delay seconds after the first unsaved change.
+    flush() writes at once (on logout, before reading progress back, at
+    exit). Changes that fail to write stay pending and are tried again
+    (completions are only counted once, so retrying is safe), so an
+    awarded completion is never dropped.
+    """
+    def __init__(self, save, quiet_period=DEFAULT_QUIET_PERIOD, max_delay=DEFAULT_MAX_DELAY,
+                 clock=time.monotonic, name="progress-writer"):
+        """
+        Args:
+            save (function): Called with (user_id, changes), returns True once written
+            quiet_period (float): Seconds without changes before writing
+            max_delay (float): Longest a change may wait to be written
+            clock (function): Time source, in seconds
+            name (str): Name of the background thread
+        """
+        self.save = save
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.clock = clock
+        self.name = name
+        self.updates = 0
+        self.writes = 0
+        self.failures = 0
+        self._pending = {}  # user_id -> {"changes", "first_change", "last_change", "due"}
+        self._changed = threading.Condition()
+        self._write_lock = threading.Lock()  # one write at a time, so a retried write cannot race a newer one
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        """Start the background writer thread"""
+        with self._changed:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def complete(self, user_id, item_type, item_id, points=0, emoji=None):
+        """
+        Queue a completed tutorial or challenge
+
+        Args:
+            user_id (int): The student's ID
+            item_type (str): "tutorial" or "challenge"
+            item_id (int): Index of the tutorial or challenge
+            points (int): Points the completion is worth (only awarded the first time)
+            emoji (str, optional): Reward emoji to add to the collection
+        """
+        changes = new_changes()
+        changes["completions"][(item_type, item_id)] = points
+        if emoji:
+            changes["emojis"].append(emoji)
+        self._queue(user_id, changes)
+
+    def award(self, user_id, points=0, emoji=None):
+        """Queue extra points and/or a reward emoji for a student"""
+        changes = new_changes()
+        changes["points"] = points
+        if emoji:
+            changes["emojis"].append(emoji)
+        self._queue(user_id, changes)
+
+    def _queue(self, user_id, changes):
+        """Add changes to a student's pending changes"""
+        now = self.clock()
+        with self._changed:
+            entry = self._pending.get(user_id)
+            if entry is None:
+                self._pending[user_id] = {"changes": changes, "first_change": now, "last_change": now, "due": False}
+            else:
+                entry.update(changes=merge_changes(entry["changes"], changes), last_change=now)
+            self.updates += 1
+            self._changed.notify()
+
+    def pending(self, user_id):
+        """Changes of a student that have not been written yet, or None"""
+        with self._changed:
+            entry = self._pending.get(user_id)
+            return None if entry is None else entry["changes"]
+
+    def request_flush(self, user_id):
+        """Ask the background thread to write a student's progress without waiting for the quiet period"""
+        with self._changed:
+            if user_id in self._pending:
+                self._pending[user_id]["due"] = True
+                self._changed.notify()
+
+    def flush(self, user_id=None):
+        """
+        Write pending progress now, in the calling thread
+
+        Args:
+            user_id (int, optional): Only this student's progress (default: everyone's)
+
+        Returns:
+            bool: False if some progress could not be written (it stays pending)
+        """
+        with self._changed:
+            user_ids = list(self._pending) if user_id is None else [user_id]
+        return all([self._write(uid) for uid in user_ids])
+
+    def close(self, timeout=5.0):
+        """Stop the background thread and write everything still pending"""
+        with self._changed:
+            self._stopping = True
+            self._changed.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """Return update/write counters and the number of students waiting to be written"""
+        with self._changed:
+            return {
+                "updates": self.updates,
+                "writes": self.writes,
+                "failures": self.failures,
+                "pending": len(self._pending)
+            }
+
+    def _next_due(self, now):
+        """Students due to be written, and seconds until the next one is (call with the lock held)"""
+        due = []
+        wait = None
+        for user_id, entry in self._pending.items():
+            at = min(entry["last_change"] + self.quiet_period, entry["first_change"] + self.max_delay)
+            if entry["due"] or at <= now:
+                due.append(user_id)
+            elif wait is None or at - now < wait:
+                wait = at - now
+        return due, wait
+
+    def _run(self):
+        """Background loop: wait for students to go quiet, then write their progress"""
+        while True:
+            with self._changed:
+                due, wait = self._next_due(self.clock())
+                while not due and not self._stopping:
+                    self._changed.wait(wait)
+                    due, wait = self._next_due(self.clock())
+                if self._stopping:
+                    return
+            for user_id in due:
+                self._write(user_id)
+
+    def _write(self, user_id):
+        """Write one student's pending progress; keep it pending if the write fails"""
+        with self._write_lock:
+            with self._changed:
+                entry = self._pending.pop(user_id, None)
+            if entry is None:
+                return True
+
+            try:
+                saved = self.save(user_id, entry["changes"])
+            except Exception as e:
+                print(f"Error saving progress for user {user_id}: {str(e)}")
+                saved = False
+
+            with self._changed:
+                if saved:
+                    self.writes += 1
+                else:
+                    self.failures += 1
+                    # Try again after another quiet period, ahead of any changes made meanwhile
+                    now = self.clock()
+                    newer = self._pending.get(user_id)
+                    if newer is not None:
+                        entry["changes"] = merge_changes(entry["changes"], newer["changes"])
+                    self._pending[user_id] = dict(entry, first_change=now, last_change=now, due=False)
+            return saved
+
+
+# Shared by every session in this process, created on first use
+_progress_writer = None
+_progress_writer_lock = threading.Lock()
+
+def get_progress_writer():
+    """Return the shared progress writer, starting it on first use"""
+    global _progress_writer
+    with _progress_writer_lock:
+        if _progress_writer is None:
+            from database_manager import get_db_manager
+
+            db = get_db_manager()
+            writer = ProgressWriter(lambda user_id, changes: save_progress_now(db, user_id, changes))
+            writer.start()
+            # Registered after the database manager's exit hooks, so it runs
+            # before them and pending progress is written while the database is open
+            atexit.register(writer.close)
+            _progress_writer = writer
+        return _progress_writer
@@ -0,0 +1,29 @@
+import pytest
+
+import certificate_verification
+from certificate_verification import RateLimiter, VerificationCache, verify_certificate_code
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(certificate_verification, "verification_cache", VerificationCache())
+    monkeypatch.setattr(certificate_verification, "session_verification_limiter", RateLimiter(limit=3))
+    monkeypatch.setattr(certificate_verification, "shared_verification_limiter", RateLimiter(limit=10, max_clients=1))
+
+
+def lookup(code):
+    return {"is_valid": code.startswith("OK")}
+
+
+def test_cached_answers_do_not_use_the_rate_limit():
+    for _ in range(50):
+        result, wait = verify_certificate_code("OK-1", lookup, None, "session-a")
+        assert result["is_valid"] and wait == 0
+    assert certificate_verification.shared_verification_limiter.retry_after("*") == 0
+
+
+def test_one_session_cannot_use_up_everyone_elses_lookups():
+    waits = [verify_certificate_code(f"BAD-{i}", lookup, None, "spammer")[1] for i in range(20)]
+    assert waits[:3] == [0, 0, 0] and all(waits[3:])
+    result, wait = verify_certificate_code("OK-2", lookup, None, "session-b")
+    assert wait == 0 and result["is_valid"]
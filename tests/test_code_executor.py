@@ -0,0 +1,37 @@
+import pytest
+
+from code_executor import execute_python_code
+from execution_pool import ExecutionPool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ExecutionPool(size=1)
+    yield pool
+    pool.shutdown()
+
+
+def run_both_ways(code, pool):
+    """Run code in a worker and in this process; both must give the same result"""
+    sandboxed = execute_python_code(code, memoize=False, pool=pool)
+    in_process = execute_python_code(code, memoize=False, sandboxed=False)
+    assert sandboxed == in_process
+    return sandboxed
+
+
+def test_exit_ends_the_program(pool):
+    assert run_both_ways("exit()", pool) == ("", None)
+
+
+def test_sys_exit_with_a_code_ends_the_program(pool):
+    assert run_both_ways("import sys\nsys.exit(3)", pool) == ("", None)
+
+
+def test_exit_keeps_output_printed_before_it(pool):
+    assert run_both_ways('print("hi"); exit()\nprint("never")', pool) == ("hi\n", None)
+
+
+def test_worker_survives_exit(pool):
+    execute_python_code("exit()", memoize=False, pool=pool)
+    worker = pool._idle.queue[0]
+    assert worker.runs >= 1 and worker.process.is_alive()
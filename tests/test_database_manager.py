@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from database_manager import MAX_SUBMISSION_CODE_CHARS, TRUNCATED_CODE_NOTICE, BufferedEventWriter, DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(db_name=str(tmp_path / "app.db"), persistent=True)
+
+
+def test_flush_gives_up_when_the_writer_is_stalled(db, monkeypatch):
+    writer = BufferedEventWriter(db, batch_size=1, max_queue=2)
+    stalled = threading.Event()
+    monkeypatch.setattr(writer, "_write", lambda batch: stalled.wait(10))
+    writer.start()
+    for i in range(5):
+        writer.log(None, "event", str(i))
+
+    started = time.monotonic()
+    assert writer.flush(timeout=0.2) is False
+    assert time.monotonic() - started < 1
+    stalled.set()
+
+
+def test_flush_waits_for_queued_events(db):
+    user_id = db.add_user("student", "hash")
+    writer = BufferedEventWriter(db, flush_interval=60)
+    writer.start()
+    writer.log(user_id, "event", "hello")
+    assert writer.flush() is True
+    assert writer.written == 1
+    writer.close()
+
+
+def test_long_submissions_are_cut_off(db):
+    user_id = db.add_user("student", "hash")
+    db.record_submission(user_id, "challenge", 0, "x = 1\n" * 100000)
+    code = db.get_last_submission(user_id, "challenge", 0)["code"]
+    assert len(code) < MAX_SUBMISSION_CODE_CHARS + 100
+    assert code.endswith(TRUNCATED_CODE_NOTICE)
@@ -0,0 +1,44 @@
+import os
+import random
+import time
+
+import pytest
+
+from execution_pool import TIMEOUT_ERROR, ExecutionPool
+
+
+@pytest.fixture
+def pool():
+    pool = ExecutionPool(size=1, wall_timeout=2)
+    yield pool
+    pool.shutdown()
+
+
+def process_running(*argv):
+    """Check whether a process with exactly this command line is running"""
+    cmdline = "\0".join(argv).encode() + b"\0"
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if f.read() == cmdline:
+                    return True
+        except OSError:
+            pass
+    return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_timeout_kills_processes_started_by_the_code(pool):
+    seconds = str(random.randint(100, 999))
+    code = f'import subprocess\nsubprocess.Popen(["sleep", "{seconds}"])\nwhile True: pass'
+    assert pool.run(code) == ("", TIMEOUT_ERROR)
+    time.sleep(0.2)
+    assert not process_running("sleep", seconds)
+
+
+def test_code_runs_in_an_empty_directory(pool):
+    output, error = pool.run('import os\nprint(os.listdir("."))\nopen("note.txt", "w").write("hi")')
+    assert (output, error) == ("[]\n", None)
+    # Files written by one run are gone before the next
+    assert pool.run('import os\nprint(os.listdir("."))') == ("[]\n", None)
+    assert os.getcwd() not in pool.run("import os\nprint(os.getcwd())")[0]
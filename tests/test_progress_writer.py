@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+
+from database_manager import DatabaseManager
+from progress_writer import ProgressWriter, save_progress_now
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(db_name=str(tmp_path / "progress.db"), persistent=True)
+
+
+@pytest.fixture
+def user_id(db):
+    return db.add_user("student", "hash")
+
+
+def test_failed_points_write_is_rolled_back_and_retried(db, user_id, monkeypatch):
+    writer = ProgressWriter(lambda user_id, changes: save_progress_now(db, user_id, changes))
+    writer.complete(user_id, "tutorial", 0, points=10)
+    writer.award(user_id, points=5)
+
+    bump_progress = db._bump_progress
+
+    def failing_points_write(cursor, user_id, points=0, tutorials=0, challenges=0):
+        if points and not (tutorials or challenges):
+            raise sqlite3.OperationalError("database is locked")
+        return bump_progress(cursor, user_id, points=points, tutorials=tutorials, challenges=challenges)
+
+    monkeypatch.setattr(db, "_bump_progress", failing_points_write)
+    assert writer.flush() is False
+    # Nothing from the failed save was committed, and it is still pending
+    assert db.get_progress_counters(user_id)["points"] == 0
+    assert writer.pending(user_id) is not None
+    assert writer.stats()["failures"] == 1
+
+    monkeypatch.setattr(db, "_bump_progress", bump_progress)
+    assert writer.flush() is True
+    counters = db.get_progress_counters(user_id)
+    assert (counters["points"], counters["tutorial_count"]) == (15, 1)
@@ -1,7 +1,7 @@
 import streamlit as st
 import hashlib
 from database_manager import db_manager
-from progress_tracker import load_progress
+from progress_tracker import load_progress, flush_progress
 
 def hash_password(password):
     """Simple password hashing"""
@@ -58,8 +58,11 @@ def create_user():
             'school': school
         }
         
-        # Add user to database
-        user_id = db_manager.add_user(new_username, hashed_password, profile_data)
+        # Add user to database and record their first login in one commit
+        with db_manager.transaction():
+            user_id = db_manager.add_user(new_username, hashed_password, profile_data)
+            if user_id:
+                db_manager.log_event(user_id, "user_login", "Initial login after account creation")
         
         if user_id:
             st.success("Account created successfully!")
@@ -75,9 +78,6 @@ def create_user():
             st.session_state.completed_challenges = []
             st.session_state.emoji_collection = []
             
-            # Log event
-            db_manager.log_event(user_id, "user_login", "Initial login after account creation")
-            
             st.rerun()
         else:
             st.error("Username already exists or there was an error creating the account. Please try again.")
@@ -128,7 +128,8 @@ def login_user():
             'school': user.get('school', '')
         }
         
-        # Load user progress
+        # Load user progress (written first if another tab still has some queued)
+        flush_progress(user["id"])
         progress = db_manager.get_user_progress(user["id"])
         
         # Update session state with progress
@@ -141,3 +142,22 @@ def login_user():
         db_manager.log_event(user["id"], "user_login", "User logged in")
         
         st.rerun()
+
+def logout_user():
+    """Log the current user out and forget everything that belonged to them in this session"""
+    # Write any progress still waiting before the student leaves
+    if st.session_state.get("user_id"):
+        flush_progress(st.session_state.user_id)
+    
+    st.session_state.username = None
+    st.session_state.user_id = None
+    st.session_state.profile = {}
+    st.session_state.points = 0
+    st.session_state.completed_tutorials = []
+    st.session_state.completed_challenges = []
+    st.session_state.emoji_collection = []
+    
+    # Code editors hold the student's last attempts
+    for key in list(st.session_state.keys()):
+        if key.startswith(("tutorial_code_", "challenge_code_")):
+            del st.session_state[key]